@@ -1,13 +1,26 @@
 from flask import Flask, request, send_file
 from flask_restx import Api, Resource, fields
 import fitz
-import face_recognition
 import numpy as np
-from PIL import Image, ImageFilter
 import io
-import pytesseract
-from pdf2image import convert_from_bytes
+import base64
 from werkzeug.datastructures import FileStorage
+from face_detector import (
+    DEFAULT_DETECTOR,
+    DEFAULT_MIN_FACE_SIZE,
+    DETECTION_MODES,
+    DETECTOR_BACKENDS,
+    detect_faces_on_page,
+    get_detector,
+    iter_image_faces,
+    to_pixel_coords,
+)
+from face_redactor import redact_face_rects, redact_faces_in_place
+from ocr_pdf import build_searchable_pdf, document_hash
+from page_cache import page_raster_cache
+from document_store import DOWNLOAD_ZOOM, ProcessedDocumentStore
+from face_mask import MASK_MODES
+from text_redactor import parse_patterns, redact_pdf_text
 
 app = Flask(__name__)
 api = Api(app, version='1.0', title='PDF Face Detection & OCR API',
@@ -16,138 +29,97 @@ api = Api(app, version='1.0', title='PDF Face Detection & OCR API',
 # Define namespaces
 pdf_ns = api.namespace('pdf', description='PDF processing operations')
 
+# Processed documents for /pdf/download, shared by all requests of this process
+document_store = ProcessedDocumentStore()
+
 # Define models for documentation
 process_response = api.model('ProcessResponse', {
     'status': fields.String(required=True, description='Processing status'),
     'total_pages': fields.Integer(description='Total number of pages'),
-    'pages': fields.List(fields.Raw, description='Page-wise results')
+    'pages': fields.List(fields.Raw, description='Page-wise results'),
+    'redacted_text_total': fields.Integer(description='Text redactions across all pages'),
+    'redacted_pdf': fields.String(description='Base64 encoded PDF with the text patterns redacted'),
+    'document_id': fields.String(description='Id for downloading processed pages from /pdf/download')
 })
 
 # Define file upload parser
 upload_parser = api.parser()
 upload_parser.add_argument('file', location='files', type=FileStorage, required=True)
 upload_parser.add_argument('text_patterns', type=str, help='Comma-separated text patterns to redact')
+upload_parser.add_argument('detection_mode', type=str, choices=DETECTION_MODES, default='full',
+                           help='full: detect on the full page render, pyramid: detect on a downscaled render, '
+                                'images: detect only on embedded images')
+upload_parser.add_argument('min_face_size', type=float, default=DEFAULT_MIN_FACE_SIZE,
+                           help='Pyramid mode: smallest face in page points to find (larger is faster, lower recall)')
+upload_parser.add_argument('detector', type=str, choices=DETECTOR_BACKENDS, default=DEFAULT_DETECTOR,
+                           help='Face detector backend: hog (dlib), dnn (OpenCV DNN model) or haar (fast cascade)')
 
-# Reuse your existing helper functions
-def perform_ocr_on_page(image):
-    """Perform OCR on an image and return the text"""
-    try:
-        text = pytesseract.image_to_string(image)
-        return text
-    except Exception as e:
-        return ""
+download_parser = api.parser()
+download_parser.add_argument('document_id', type=str, required=True, location='args',
+                             help='document_id returned by /pdf/process')
+download_parser.add_argument('mask_mode', type=str, choices=MASK_MODES, default='blur', location='args',
+                             help='How faces are hidden: blur, pixelate or fill (solid black)')
 
 def create_searchable_pdf(pdf_file):
-    """Convert image-based PDF to searchable PDF"""
+    """Add an invisible OCR text layer to the pages of a PDF that have no text"""
     try:
-        # Convert PDF to images
-        pdf_bytes = io.BytesIO(pdf_file.read())
-        images = convert_from_bytes(pdf_bytes.getvalue())
-        
-        # Create new PDF
-        output_pdf = fitz.open()
-        
-        for img in images:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_bytes = img_byte_arr.getvalue()
-            
-            # Create new PDF page
-            page = output_pdf.new_page(width=img.width, height=img.height)
-            
-            # Insert image and OCR text
-            page.insert_image(page.rect, stream=img_bytes)
-            text = perform_ocr_on_page(img)
-            if text:
-                page.insert_text((0, 0), text)
-        
-        # Convert to bytes
-        output_bytes = io.BytesIO()
-        output_pdf.save(output_bytes)
-        output_pdf.close()
-        
-        return output_bytes.getvalue()
+        return build_searchable_pdf(pdf_file.read())
     except Exception as e:
         return None
 
-def process_pdf_faces(pdf_file):
-    """Process PDF file for face detection"""
+def api_face_locations(page, face_locations):
+    """Page-point boxes as int (top, right, bottom, left) pixels of a 72 dpi render
+
+    That is the shape /pdf/process has always returned, whatever the detection mode.
+    """
+    origin = (page.rect.x0, page.rect.y0)
+    return [to_pixel_coords(loc, 1.0, origin) for loc in face_locations]
+
+def process_pdf_faces(pdf_file, detection_mode='full', min_face_size=DEFAULT_MIN_FACE_SIZE,
+                      detector=None):
+    """
+    Process PDF file for face detection
+
+    Returns the API results and, per page, the exact boxes in page points.
+    """
+    page_boxes = []
     try:
-        pdf_bytes = io.BytesIO(pdf_file.read())
-        pdf_document = fitz.open(stream=pdf_bytes)
+        pdf_data = pdf_file.read()
+        pdf_document = fitz.open(stream=pdf_data, filetype='pdf')
         results = {
             'status': 'success',
             'total_pages': len(pdf_document),
             'pages': []
         }
 
+        # Images reused across pages are only decoded and scanned once
+        xref_cache = {}
+        # Page renders are shared with later requests for the same document
+        render = page_raster_cache.renderer(document_hash(pdf_data))
+
         for page_num in range(len(pdf_document)):
             page = pdf_document[page_num]
-            pix = page.get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Convert PIL Image to numpy array for face_recognition
-            img_np = np.array(img)
-            
-            # Detect faces
-            face_locations = face_recognition.face_locations(img_np)
+
+            # Detect faces, boxes are (top, right, bottom, left) in page points
+            face_locations = detect_faces_on_page(
+                page, mode=detection_mode, min_face_size=min_face_size, detector=detector,
+                xref_cache=xref_cache, render=render
+            )
             
             # Store results
             page_results = {
                 'page_number': page_num + 1,
                 'faces_found': len(face_locations),
-                'face_locations': face_locations
+                'face_locations': api_face_locations(page, face_locations)
             }
             results['pages'].append(page_results)
+            page_boxes.append(face_locations)
 
         pdf_document.close()
-        return results
+        return results, page_boxes
 
     except Exception as e:
-        return {'status': 'error', 'message': str(e)}
-
-def redact_text_on_page(pdf_file, page_num, text_patterns):
-    """Redact specified text patterns on a page"""
-    try:
-        pdf_document = fitz.open(stream=pdf_file)
-        page = pdf_document[page_num]
-        redaction_count = 0
-        
-        # Split patterns if provided as comma-separated string
-        if isinstance(text_patterns, str):
-            patterns = [p.strip() for p in text_patterns.split(',')]
-        else:
-            patterns = text_patterns
-
-        for pattern in patterns:
-            instances = page.search_for(pattern)
-            redaction_count += len(instances)
-            [page.add_redact_annot(inst, fill=(0, 0, 0)) for inst in instances]
-        
-        page.apply_redactions()
-        return pdf_document, redaction_count
-
-    except Exception as e:
-        return None, 0
-
-def mask_faces_on_page(img_np, face_locations, blur=True):
-    """Mask detected faces in an image either by blurring or black rectangle"""
-    img = Image.fromarray(img_np)
-    
-    for (top, right, bottom, left) in face_locations:
-        face_region = img.crop((left, top, right, bottom))
-        
-        if blur:
-            # Apply Gaussian blur
-            face_region = face_region.filter(ImageFilter.GaussianBlur(radius=15))
-        else:
-            # Create black rectangle
-            face_region = Image.new('RGB', (right-left, bottom-top), 'black')
-        
-        img.paste(face_region, (left, top, right, bottom))
-    
-    return img
+        return {'status': 'error', 'message': str(e)}, page_boxes
 
 @pdf_ns.route('/process')
 class ProcessPDF(Resource):
@@ -166,44 +138,37 @@ class ProcessPDF(Resource):
 
             print(f"Processing file: {pdf_file.filename}")  # Debug print
             
-            # Check if PDF needs OCR
-            pdf_bytes = io.BytesIO(pdf_file.read())
-            pdf_document = fitz.open(stream=pdf_bytes)
-            
-            needs_ocr = True
-            for page in pdf_document:
-                if page.get_text().strip():
-                    needs_ocr = False
-                    break
-            pdf_document.close()
-            
-            # Reset file pointer
-            pdf_file.seek(0)
-            
-            if needs_ocr:
-                searchable_pdf = create_searchable_pdf(pdf_file)
-                if searchable_pdf:
-                    pdf_file = io.BytesIO(searchable_pdf)
+            # Read the upload once, every stage below works from these bytes
+            pdf_data = pdf_file.read()
+
+            # OCR only the pages that are scans, decided page by page
+            searchable_pdf = create_searchable_pdf(io.BytesIO(pdf_data))
+            if searchable_pdf:
+                pdf_data = searchable_pdf
 
             # Process faces and text
-            results = process_pdf_faces(pdf_file)
+            results, page_boxes = process_pdf_faces(
+                io.BytesIO(pdf_data),
+                detection_mode=args.get('detection_mode') or 'full',
+                min_face_size=args.get('min_face_size') or DEFAULT_MIN_FACE_SIZE,
+                detector=args.get('detector')
+            )
             
-            if results['status'] == 'success' and text_patterns:
-                # Apply text redaction if patterns provided
-                pdf_bytes = io.BytesIO(pdf_file.read())
-                pdf_document = fitz.open(stream=pdf_bytes)
-                
-                for page_num in range(len(pdf_document)):
-                    _, redaction_count = redact_text_on_page(
-                        pdf_file,
-                        page_num,
-                        text_patterns
-                    )
+            if results['status'] != 'success':
+                return results
+
+            processed_pdf = pdf_data
+            if parse_patterns(text_patterns):
+                # Redact every pattern on every page with the document opened once
+                counts, processed_pdf = redact_pdf_text(pdf_data, text_patterns)
+                for page_num, redaction_count in enumerate(counts):
                     if redaction_count > 0:
                         results['pages'][page_num]['redacted_text_count'] = redaction_count
-                
-                pdf_document.close()
+                results['redacted_text_total'] = sum(counts)
+                results['redacted_pdf'] = base64.b64encode(processed_pdf).decode('ascii')
 
+            # Keep the result so pages can be downloaded without re-uploading
+            results['document_id'] = document_store.add(processed_pdf, page_boxes)
             return results
 
         except Exception as e:
@@ -212,16 +177,42 @@ class ProcessPDF(Resource):
 
 @pdf_ns.route('/download/<int:page_num>')
 class DownloadProcessedPage(Resource):
-    @pdf_ns.doc(params={'page_num': 'Page number to download'})
+    @pdf_ns.expect(download_parser)
+    @pdf_ns.doc(params={'page_num': 'Page number to download, starting at 1'})
     @pdf_ns.response(200, 'Success')
+    @pdf_ns.response(304, 'Not Modified')
     @pdf_ns.response(400, 'Bad Request')
+    @pdf_ns.response(404, 'Unknown or expired document')
     def get(self, page_num):
-        """Download a processed page as an image"""
+        """Download a processed page as a PNG, with faces masked and text redactions applied"""
         try:
-            # Implementation for downloading processed pages
-            # You'll need to implement session handling or temporary storage
-            # for processed files
-            pass
+            args = download_parser.parse_args()
+            document = document_store.get(args['document_id'])
+            if document is None:
+                return {'status': 'error', 'message': 'Unknown or expired document id'}, 404
+            if not 1 <= page_num <= len(document.face_locations):
+                return {'status': 'error', 'message': f'Page {page_num} does not exist'}, 400
+
+            # Pages never change for a document id, answer revalidations without rendering
+            mask_mode = args.get('mask_mode') or 'blur'
+            etag = document.etag(page_num, DOWNLOAD_ZOOM, mask_mode)
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                response.cache_control.private = True
+                response.cache_control.max_age = document_store.ttl
+                return response
+
+            response = send_file(
+                io.BytesIO(document_store.page_png(document, page_num, mask_mode=mask_mode)),
+                mimetype='image/png',
+                download_name=f'page_{page_num}.png',
+                etag=etag,
+                max_age=document_store.ttl,
+            )
+            response.cache_control.public = False
+            response.cache_control.private = True
+            return response
         except Exception as e:
             return {'status': 'error', 'message': str(e)}, 400
 
@@ -241,10 +232,11 @@ class RedactFacesPDF(Resource):
 
             print(f"Processing file: {pdf_file.filename}")
             
-            # Read PDF
-            pdf_bytes = io.BytesIO(pdf_file.read())
-            pdf_document = fitz.open(stream=pdf_bytes)
-            output_pdf = fitz.open()  # New PDF for output
+            # Read PDF, faces are redacted in place in this document
+            pdf_data = pdf_file.read()
+            pdf_document = fitz.open(stream=pdf_data, filetype='pdf')
+            render = page_raster_cache.renderer(document_hash(pdf_data))
+            detection_mode = args.get('detection_mode') or 'full'
             
             results = {
                 'status': 'success',
@@ -252,48 +244,49 @@ class RedactFacesPDF(Resource):
                 'pages': []
             }
 
+            # Images reused across pages are only decoded and scanned once
+            xref_cache = {}
+
             for page_num in range(len(pdf_document)):
                 page = pdf_document[page_num]
-                pix = page.get_pixmap()
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # Convert to numpy array for face detection
-                img_np = np.array(img)
-                
-                # Detect faces
-                face_locations = face_recognition.face_locations(img_np)
-                
-                if face_locations:
-                    # Mask faces if found
-                    masked_img = mask_faces_on_page(img_np, face_locations, blur=True)
-                    
-                    # Create new PDF page
-                    new_page = output_pdf.new_page(width=page.rect.width, 
-                                                 height=page.rect.height)
-                    
-                    # Convert masked image to bytes
-                    img_byte_arr = io.BytesIO()
-                    masked_img.save(img_byte_arr, format='PNG')
-                    img_bytes = img_byte_arr.getvalue()
-                    
-                    # Insert masked image
-                    new_page.insert_image(new_page.rect, stream=img_bytes)
+
+                # Detect faces, boxes are (top, right, bottom, left) in page points
+                if detection_mode == 'images':
+                    hits = list(iter_image_faces(
+                        page, get_detector(args.get('detector')), xref_cache
+                    ))
+                    face_locations = [box for _, box in hits]
+                    # Faces in xref images are blurred in the image itself below,
+                    # inline images have no xref and get a redaction instead
+                    page_redactions = [box for xref, box in hits if xref == 0]
                 else:
-                    # If no faces found, copy original page
-                    output_pdf.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
+                    face_locations = detect_faces_on_page(
+                        page,
+                        mode=detection_mode,
+                        min_face_size=args.get('min_face_size') or DEFAULT_MIN_FACE_SIZE,
+                        detector=args.get('detector'),
+                        render=render
+                    )
+                    page_redactions = face_locations
+                
+                if page_redactions:
+                    # Blank only the image pixels under the faces, keep the text layer
+                    redact_face_rects(page, page_redactions)
                 
                 # Store results
                 page_results = {
                     'page_number': page_num + 1,
                     'faces_found': len(face_locations),
-                    'face_locations': face_locations
+                    'face_locations': api_face_locations(page, face_locations)
                 }
                 results['pages'].append(page_results)
 
-            # Save processed PDF to bytes
+            # Swap each image that contains faces for a blurred copy
+            redact_faces_in_place(pdf_document, xref_cache)
+
+            # Save processed PDF to bytes, dropping the replaced image streams
             output_bytes = io.BytesIO()
-            output_pdf.save(output_bytes)
-            output_pdf.close()
+            pdf_document.save(output_bytes, garbage=3, deflate=True)
             pdf_document.close()
             
             # Return processed PDF
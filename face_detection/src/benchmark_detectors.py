@@ -0,0 +1,129 @@
+"""Benchmark face detector backends for latency and recall on a local sample set.
+
+The sample directory holds images plus an ``annotations.json`` mapping each
+image file name to its ground-truth faces as [top, right, bottom, left]
+pixel boxes, e.g. ``{"team.jpg": [[40, 210, 150, 100]]}``.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from face_detector import DETECTOR_BACKENDS, get_detector
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def count_matches(detections, ground_truth, threshold=0.5):
+    """Greedily match detections to ground truth faces by IoU"""
+    unmatched = list(detections)
+    matched = 0
+    for truth in ground_truth:
+        best = max(unmatched, key=lambda d: iou(d, truth), default=None)
+        if best is not None and iou(best, truth) >= threshold:
+            unmatched.remove(best)
+            matched += 1
+    return matched
+
+
+def load_samples(sample_dir):
+    """Load (name, RGB array, ground truth boxes) from a sample directory"""
+    with open(os.path.join(sample_dir, "annotations.json")) as f:
+        annotations = json.load(f)
+    samples = []
+    for name, boxes in sorted(annotations.items()):
+        with Image.open(os.path.join(sample_dir, name)) as img:
+            samples.append((name, np.array(img.convert("RGB")), boxes))
+    return samples
+
+
+def benchmark_backend(backend, samples, iou_threshold=0.5):
+    """Run one backend over the samples and report latency, recall and precision"""
+    detector = get_detector(backend)
+    # Warm up so model loading and first-call setup are not timed
+    detector.detect(samples[0][1])
+
+    latencies = []
+    total_truth = total_detected = total_matched = 0
+    for _, img_np, truth in samples:
+        start = time.perf_counter()
+        detections = detector.detect(img_np)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        total_truth += len(truth)
+        total_detected += len(detections)
+        total_matched += count_matches(detections, truth, iou_threshold)
+
+    return {
+        "backend": backend,
+        "images": len(samples),
+        "latency_ms_mean": round(float(np.mean(latencies)), 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "recall": round(total_matched / total_truth, 4) if total_truth else None,
+        "precision": (
+            round(total_matched / total_detected, 4) if total_detected else None
+        ),
+    }
+
+
+def run_benchmark(sample_dir, backends, iou_threshold=0.5):
+    samples = load_samples(sample_dir)
+    if not samples:
+        raise ValueError(f"No annotated samples found in {sample_dir}")
+
+    results = []
+    for backend in backends:
+        try:
+            results.append(benchmark_backend(backend, samples, iou_threshold))
+        except Exception as e:
+            # e.g. the DNN model files are not deployed on this machine
+            results.append({"backend": backend, "error": str(e)})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare face detector backends on a local sample set"
+    )
+    parser.add_argument("sample_dir", help="Directory with images and annotations.json")
+    parser.add_argument(
+        "--backends",
+        default=",".join(DETECTOR_BACKENDS),
+        help="Comma-separated backends to benchmark. Default: all",
+    )
+    parser.add_argument(
+        "--iou", type=float, default=0.5, help="IoU needed to count a match"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.sample_dir, [b.strip() for b in args.backends.split(",")], args.iou
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print(f"{'backend':<8} {'mean ms':>9} {'p95 ms':>9} {'recall':>8} {'precision':>10}")
+        for r in results:
+            if "error" in r:
+                print(f"{r['backend']:<8} error: {r['error']}")
+                continue
+            print(
+                f"{r['backend']:<8} {r['latency_ms_mean']:>9} {r['latency_ms_p95']:>9} "
+                f"{r['recall']!s:>8} {r['precision']!s:>10}"
+            )
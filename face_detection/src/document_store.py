@@ -0,0 +1,111 @@
+"""Session store of processed PDFs, serving page images rendered on demand"""
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from face_detector import to_pixel_coords
+from face_mask import mask_faces
+from ocr_pdf import document_hash
+from page_cache import page_raster_cache
+
+DOWNLOAD_ZOOM = 2.0
+
+
+class ProcessedDocument:
+    def __init__(self, pdf_data, face_locations):
+        self.pdf_data = pdf_data
+        self.doc_hash = document_hash(pdf_data)
+        # Per page (top, right, bottom, left) boxes in page points
+        self.face_locations = face_locations
+        self.pages = {}
+        self.last_access = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return len(self.pdf_data) + sum(len(png) for png in self.pages.values())
+
+    def etag(self, page_num, zoom, mask_mode):
+        """Known before rendering, so conditional requests never render"""
+        return f"{self.doc_hash[:32]}-{page_num}-{zoom:g}-{mask_mode}"
+
+
+class ProcessedDocumentStore:
+    """
+    Processed documents keyed by a random document id
+
+    Entries expire ttl seconds after their last access, and the least
+    recently used ones are dropped once the PDFs plus their rendered pages
+    exceed max_bytes. Pages are rendered on first download only.
+    """
+
+    def __init__(
+        self,
+        ttl=int(os.environ.get('DOCUMENT_STORE_TTL', 1800)),
+        max_bytes=int(os.environ.get('DOCUMENT_STORE_MAX_MB', 256)) * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, pdf_data, face_locations):
+        """Store a processed PDF with its per-page face boxes, returns the document id"""
+        document_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._documents[document_id] = ProcessedDocument(pdf_data, face_locations)
+            self._evict()
+        return document_id
+
+    def get(self, document_id):
+        """Return a live document and mark it as used, or None if unknown or expired"""
+        with self._lock:
+            self._evict()
+            document = self._documents.get(document_id)
+            if document is not None:
+                document.last_access = time.monotonic()
+                self._documents.move_to_end(document_id)
+            return document
+
+    def page_png(self, document, page_num, zoom=DOWNLOAD_ZOOM, mask_mode="blur"):
+        """PNG of a processed page (1-based) with its faces masked, rendered once"""
+        key = (page_num, zoom, mask_mode)
+        png = document.pages.get(key)
+        if png is not None:
+            return png
+
+        # One writable copy of the cached render, faces are masked in place on it
+        img_np = np.array(page_raster_cache.page_image(
+            document.pdf_data, page_num - 1, zoom, doc_hash=document.doc_hash
+        ))
+        boxes = [to_pixel_coords(loc, zoom) for loc in document.face_locations[page_num - 1]]
+        mask_faces(img_np, boxes, mask_mode)
+        ok, buffer = cv2.imencode('.png', cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR))
+        if not ok:
+            raise ValueError(f"Could not encode page {page_num}")
+        png = buffer.tobytes()
+
+        with self._lock:
+            document.pages[key] = png
+            self._evict()
+        return png
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [
+            document_id
+            for document_id, document in self._documents.items()
+            if now - document.last_access > self.ttl
+        ]
+        for document_id in expired:
+            del self._documents[document_id]
+
+        total = sum(document.nbytes for document in self._documents.values())
+        # Keep the newest document even if it is larger than the cap on its own
+        while total > self.max_bytes and len(self._documents) > 1:
+            _, document = self._documents.popitem(last=False)
+            total -= document.nbytes
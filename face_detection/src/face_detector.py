@@ -0,0 +1,214 @@
+"""Face detection helpers shared by the Flask and Streamlit apps"""
+import fitz
+import numpy as np
+from datarakshak_shared.face_detector import (  # noqa: F401
+    DEFAULT_DETECTOR,
+    DETECTOR_BACKENDS,
+    MAX_IMAGE_SIDE,
+    DNNFaceDetector,
+    FaceDetector,
+    HaarFaceDetector,
+    HOGFaceDetector,
+    detect_faces_normalized,
+    get_detector,
+    image_to_array,
+)
+
+# Default smallest face, in page points, the pyramid mode must still find
+DEFAULT_MIN_FACE_SIZE = 48.0
+
+DETECTION_MODES = ("full", "pyramid", "images")
+
+
+def render_page(page, zoom=1.0, clip=None):
+    """Render a page (or a clip of it) to an RGB numpy array"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+        pix.height, pix.width, pix.n
+    )
+
+
+def detect_faces(img_np, detector=None, small_faces=True):
+    """Run a face detector on an RGB array, returning (top, right, bottom, left)"""
+    detector = detector or get_detector()
+    return detector.detect(img_np, small_faces=small_faces)
+
+
+def to_page_coords(location, zoom, origin=(0, 0)):
+    """Map a pixel (top, right, bottom, left) box back to page coordinates"""
+    top, right, bottom, left = location
+    ox, oy = origin
+    return (
+        round(float(oy + top / zoom), 2),
+        round(float(ox + right / zoom), 2),
+        round(float(oy + bottom / zoom), 2),
+        round(float(ox + left / zoom), 2),
+    )
+
+
+def to_pixel_coords(location, zoom, origin=(0, 0)):
+    """Map a page-coordinate (top, right, bottom, left) box onto a render at zoom"""
+    top, right, bottom, left = location
+    ox, oy = origin
+    return (
+        int((top - oy) * zoom),
+        int(round((right - ox) * zoom)),
+        int(round((bottom - oy) * zoom)),
+        int((left - ox) * zoom),
+    )
+
+
+def detect_faces_full(page, zoom=1.0, detector=None, render=render_page):
+    """Detect faces on a full-page render at the given zoom"""
+    img_np = render(page, zoom)
+    origin = (page.rect.x0, page.rect.y0)
+    return [
+        to_page_coords(loc, zoom, origin) for loc in detect_faces(img_np, detector)
+    ]
+
+
+def detect_faces_pyramid(
+    page,
+    min_face_size=DEFAULT_MIN_FACE_SIZE,
+    refine_zoom=2.0,
+    margin=0.25,
+    detector=None,
+    render=render_page,
+):
+    """
+    Detect faces on a downscaled render, then refine candidates at higher zoom
+
+    The page is rendered just large enough for a face of min_face_size points
+    to reach the detector's minimum size. Each candidate is then re-detected
+    on a clip rendered at refine_zoom (only when that is meaningfully sharper)
+    to tighten its box. Larger min_face_size is faster but misses smaller
+    faces. Boxes are returned as (top, right, bottom, left) in page points.
+    """
+    detector = detector or get_detector()
+    coarse_zoom = min(refine_zoom, detector.min_face_px / float(min_face_size))
+    origin = (page.rect.x0, page.rect.y0)
+    candidates = [
+        to_page_coords(loc, coarse_zoom, origin)
+        for loc in detect_faces(render(page, coarse_zoom), detector)
+    ]
+
+    if refine_zoom < coarse_zoom * 1.5:
+        return candidates
+
+    faces = []
+    for top, right, bottom, left in candidates:
+        pad_x = (right - left) * margin
+        pad_y = (bottom - top) * margin
+        clip = fitz.Rect(left - pad_x, top - pad_y, right + pad_x, bottom + pad_y)
+        clip &= page.rect
+        if clip.is_empty:
+            continue
+
+        # Faces in the clip are already large enough, no need to upsample
+        refined = detect_faces(
+            render_page(page, refine_zoom, clip), detector, small_faces=False
+        )
+        if refined:
+            # Keep the largest hit, it is the candidate we zoomed in on
+            best = max(refined, key=lambda l: (l[1] - l[3]) * (l[2] - l[0]))
+            faces.append(to_page_coords(best, refine_zoom, (clip.x0, clip.y0)))
+        else:
+            faces.append((top, right, bottom, left))
+    return faces
+
+
+def iter_image_faces(
+    page, detector=None, xref_cache=None, max_side=MAX_IMAGE_SIDE, clip_zoom=2.0
+):
+    """
+    Detect faces on the embedded images of a page only, yielding (xref, box)
+
+    Pages without images are skipped without rendering. Each image xref is
+    decoded and run through the detector once; pass the same xref_cache dict
+    for every page of a document so images reused across pages are only
+    processed the first time. xref_cache maps each xref to its faces as
+    boxes normalized to the image (0..1). Inline images (xref 0) fall back
+    to rendering their area of the page. Boxes are (top, right, bottom,
+    left) in page points, in the same space as the page renders.
+    """
+    detector = detector or get_detector()
+    if xref_cache is None:
+        xref_cache = {}
+
+    # Image info is reported in unrotated page space
+    unrotated_rect = page.rect * page.derotation_matrix
+
+    for info in page.get_image_info(xrefs=True):
+        bbox = fitz.Rect(info["bbox"]) & unrotated_rect
+        if bbox.is_empty:
+            continue
+
+        xref = info.get("xref", 0)
+        if xref == 0:
+            # Inline image: render just its area at a modest zoom
+            img_np = render_page(page, clip_zoom, clip=bbox)
+            found = detect_faces_normalized(img_np, detector, max_side)
+            to_page = fitz.Matrix(bbox.width, 0, 0, bbox.height, bbox.x0, bbox.y0)
+        else:
+            if xref not in xref_cache:
+                img_np = image_to_array(page.parent, xref)
+                xref_cache[xref] = (
+                    [] if img_np is None
+                    else detect_faces_normalized(img_np, detector, max_side)
+                )
+            found = xref_cache[xref]
+            # Maps the image's unit square onto the page
+            to_page = fitz.Matrix(info["transform"])
+
+        for top, right, bottom, left in found:
+            rect = fitz.Rect(left, top, right, bottom) * to_page
+            rect = rect * page.rotation_matrix
+            rect.normalize()
+            yield xref, (
+                round(rect.y0, 2),
+                round(rect.x1, 2),
+                round(rect.y1, 2),
+                round(rect.x0, 2),
+            )
+
+
+def detect_faces_in_images(
+    page, detector=None, xref_cache=None, max_side=MAX_IMAGE_SIDE, clip_zoom=2.0
+):
+    """Detect faces on the embedded images of a page, see iter_image_faces"""
+    return [
+        box
+        for _, box in iter_image_faces(
+            page, detector, xref_cache, max_side, clip_zoom
+        )
+    ]
+
+
+def detect_faces_on_page(
+    page,
+    mode="full",
+    zoom=1.0,
+    min_face_size=DEFAULT_MIN_FACE_SIZE,
+    detector=None,
+    xref_cache=None,
+    render=None,
+):
+    """Detect faces on a page with the requested mode, in page coordinates
+
+    detector may be a FaceDetector instance or a backend name. xref_cache
+    is only used by the images mode, see detect_faces_in_images. render
+    replaces render_page for full-page renders, e.g. a raster cache.
+    """
+    if detector is None or isinstance(detector, str):
+        detector = get_detector(detector)
+    render = render or render_page
+    if mode == "full":
+        return detect_faces_full(page, zoom, detector, render)
+    if mode == "pyramid":
+        return detect_faces_pyramid(
+            page, min_face_size, refine_zoom=max(zoom, 1.0), detector=detector,
+            render=render,
+        )
+    if mode == "images":
+        return detect_faces_in_images(page, detector, xref_cache)
+    raise ValueError(f"Unsupported detection mode: {mode}")
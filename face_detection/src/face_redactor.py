@@ -0,0 +1,90 @@
+"""In-place face redaction for PDFs, leaving the rest of each page untouched"""
+import cv2
+import fitz
+import numpy as np
+
+from face_detector import image_to_array
+from face_mask import blur_faces
+
+# Older PyMuPDF releases have no text option and always remove covered text
+_KEEP_TEXT = (
+    {"text": fitz.PDF_REDACT_TEXT_NONE}
+    if hasattr(fitz, "PDF_REDACT_TEXT_NONE")
+    else {}
+)
+
+
+def _blur_boxes(img_np, boxes):
+    """Blur (top, right, bottom, left) boxes normalized to 0..1, in place"""
+    h, w = img_np.shape[:2]
+    return blur_faces(
+        img_np,
+        [(top * h, right * w, bottom * h, left * w) for top, right, bottom, left in boxes],
+    )
+
+
+def blur_image_xref(doc, xref, boxes, jpeg_quality=85):
+    """
+    Overwrite an embedded image's stream with a copy whose face boxes are blurred
+
+    boxes are normalized to the image, as stored in the detector's xref_cache.
+    JPEG sources are re-encoded as JPEG, anything else is stored as deflated
+    RGB samples, so the document stays close to its original size. The
+    xref is updated in place, so every placement of the image changes.
+    """
+    img_np = image_to_array(doc, xref)
+    if img_np is None:
+        return False
+    img_np = _blur_boxes(img_np.copy(), boxes)
+    h, w = img_np.shape[:2]
+
+    ext = doc.extract_image(xref).get("ext", "png")
+    if ext in ("jpg", "jpeg", "jpx"):
+        ok, buffer = cv2.imencode(
+            ".jpg",
+            cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR),
+            [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality],
+        )
+        if not ok:
+            raise ValueError(f"Could not encode blurred image for xref {xref}")
+        doc.update_stream(xref, buffer.tobytes(), compress=False)
+        doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    else:
+        doc.update_stream(xref, img_np.tobytes(), compress=True)
+        doc.xref_set_key(xref, "Filter", "/FlateDecode")
+
+    # The samples are now plain 8-bit RGB of the decoded size
+    doc.xref_set_key(xref, "Width", str(w))
+    doc.xref_set_key(xref, "Height", str(h))
+    doc.xref_set_key(xref, "ColorSpace", "/DeviceRGB")
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    for key in ("DecodeParms", "Decode", "ImageMask", "Mask"):
+        doc.xref_set_key(xref, key, "null")
+    return True
+
+
+def redact_face_rects(page, face_locations, fill=(0, 0, 0)):
+    """
+    Cover face boxes with image-only redactions
+
+    Image pixels under each box are blanked and the box is filled, while
+    text and vector graphics on the page are kept. face_locations are
+    (top, right, bottom, left) in page points as returned by the detector.
+    """
+    for top, right, bottom, left in face_locations:
+        rect = fitz.Rect(left, top, right, bottom) * page.derotation_matrix
+        page.add_redact_annot(rect, fill=fill)
+    page.apply_redactions(
+        images=fitz.PDF_REDACT_IMAGE_PIXELS,
+        graphics=fitz.PDF_REDACT_LINE_ART_NONE,
+        **_KEEP_TEXT,
+    )
+
+
+def redact_faces_in_place(doc, xref_faces):
+    """Blur every image xref that has faces, returns the number of images changed"""
+    return sum(
+        1
+        for xref, boxes in xref_faces.items()
+        if boxes and blur_image_xref(doc, xref, boxes)
+    )
@@ -0,0 +1,96 @@
+"""Searchable PDF builder: PyMuPDF rasterization plus an invisible OCR text layer"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fitz
+from datarakshak_shared import pdf_text_layer
+from datarakshak_shared.pdf_text_layer import DEFAULT_OCR_DPI, pages_needing_ocr
+
+
+class PageOCRCache:
+    """Thread-safe LRU of OCR words keyed by (document hash, page, dpi, language)"""
+
+    def __init__(self, max_pages=int(os.environ.get("OCR_CACHE_MAX_PAGES", 2048))):
+        self.max_pages = max_pages
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            words = self._entries.get(key)
+            if words is not None:
+                self._entries.move_to_end(key)
+            return words
+
+    def put(self, key, words):
+        with self._lock:
+            self._entries[key] = words
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_pages:
+                self._entries.popitem(last=False)
+
+
+# Shared by the Flask service and the Streamlit app, so analysing and then
+# redacting the same upload only OCRs each page once
+page_ocr_cache = PageOCRCache()
+
+
+def document_hash(pdf_data):
+    return hashlib.sha256(pdf_data).hexdigest()
+
+
+def add_ocr_text_layer(
+    doc,
+    dpi=DEFAULT_OCR_DPI,
+    lang="eng",
+    max_workers=None,
+    pages=None,
+    doc_hash=None,
+    cache=page_ocr_cache,
+):
+    """
+    OCR the pages of an open document that need it, in place
+
+    See pdf_text_layer.add_ocr_text_layer. When doc_hash is given, words
+    are looked up in and stored to the page cache, so cached pages are not
+    even rendered. Returns the number of OCR words added per page number.
+    """
+    cached_words = on_words = None
+    if doc_hash and cache is not None:
+
+        def cached_words(page_num):
+            return cache.get((doc_hash, page_num, dpi, lang))
+
+        def on_words(page_num, words):
+            cache.put((doc_hash, page_num, dpi, lang), words)
+
+    return pdf_text_layer.add_ocr_text_layer(
+        doc,
+        pages,
+        dpi,
+        lang,
+        max_workers,
+        cached_words=cached_words,
+        on_words=on_words,
+    )
+
+
+def build_searchable_pdf(pdf_data, dpi=DEFAULT_OCR_DPI, lang="eng", max_workers=None):
+    """
+    Return PDF bytes where every page that needs OCR gets an invisible text layer
+
+    Documents where no page needs OCR are returned unchanged.
+    """
+    doc = fitz.open(stream=pdf_data, filetype="pdf")
+    try:
+        pages = pages_needing_ocr(doc)
+        if not pages:
+            return pdf_data
+        add_ocr_text_layer(
+            doc, dpi, lang, max_workers, pages=pages, doc_hash=document_hash(pdf_data)
+        )
+        return doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
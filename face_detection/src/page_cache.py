@@ -0,0 +1,91 @@
+"""Rendered page raster cache shared by detection, masking and preview"""
+import os
+import threading
+from collections import OrderedDict
+
+import fitz
+
+from face_detector import render_page
+from ocr_pdf import document_hash
+
+
+class PageRasterCache:
+    """
+    Byte-bounded LRU of page renders keyed by (document hash, page, zoom)
+
+    Cached arrays are shared between callers and marked read-only, so
+    anything that draws on a render must copy it first.
+    """
+
+    def __init__(self, max_bytes=int(os.environ.get("PAGE_CACHE_MAX_MB", 256)) * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            img_np = self._entries.get(key)
+            if img_np is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return img_np
+
+    def put(self, key, img_np):
+        img_np.flags.writeable = False
+        if img_np.nbytes > self.max_bytes:
+            return img_np
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old.nbytes
+            self._entries[key] = img_np
+            self._current_bytes += img_np.nbytes
+            while self._current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= evicted.nbytes
+        return img_np
+
+    def render(self, doc_hash, page, zoom=1.0):
+        """Return the render of an open page, rendering it only on a miss"""
+        key = (doc_hash, page.number, float(zoom))
+        img_np = self.get(key)
+        if img_np is None:
+            img_np = self.put(key, render_page(page, zoom))
+        return img_np
+
+    def renderer(self, doc_hash):
+        """A render_page replacement for one document, for detect_faces_on_page"""
+        return lambda page, zoom=1.0: self.render(doc_hash, page, zoom)
+
+    def page_image(self, pdf_data, page_num, zoom=1.0, doc_hash=None):
+        """Return a page render from PDF bytes, only opening the PDF on a miss"""
+        key = (doc_hash or document_hash(pdf_data), page_num, float(zoom))
+        img_np = self.get(key)
+        if img_np is not None:
+            return img_np
+        doc = fitz.open(stream=pdf_data, filetype="pdf")
+        try:
+            return self.put(key, render_page(doc[page_num], zoom))
+        finally:
+            doc.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# One cache per process, shared by the Flask service and the Streamlit helpers
+page_raster_cache = PageRasterCache()
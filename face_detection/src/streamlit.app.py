@@ -1,13 +1,31 @@
 import streamlit as st
 import fitz  # PyMuPDF
 import os
-import face_recognition
+import concurrent.futures
 import numpy as np
 from PIL import Image
 import io
 import cv2
-import pytesseract
-from pdf2image import convert_from_bytes
+from face_detector import (
+    DEFAULT_DETECTOR,
+    DEFAULT_MIN_FACE_SIZE,
+    DETECTION_MODES,
+    DETECTOR_BACKENDS,
+    detect_faces_on_page,
+    get_detector,
+)
+from ocr_pdf import build_searchable_pdf, document_hash
+from face_mask import fill_faces
+from page_cache import page_raster_cache
+
+# Zoom used for face detection and page previews, so both share one render
+PREVIEW_ZOOM = 2.0
+
+# Detection runs off the script thread so reruns are not blocked by it
+DETECTION_WORKERS = 2
+
+# Finished jobs hold the upload bytes, only the most recent ones are kept
+MAX_DETECTION_JOBS = 16
 
 # Configure page settings
 st.set_page_config(
@@ -20,115 +38,66 @@ st.set_page_config(
 st.title("PDF Face Detection & OCR App")
 st.write("Upload a PDF to detect faces and perform text redaction (works with both text and image-based PDFs)")
 
-def perform_ocr_on_page(image):
-    """Perform OCR on an image and return the text"""
-    try:
-        text = pytesseract.image_to_string(image)
-        return text
-    except Exception as e:
-        st.error(f"OCR Error: {str(e)}")
-        return ""
+@st.cache_resource
+def load_detector(name):
+    """Face detector models are loaded once per process"""
+    return get_detector(name)
 
-def create_searchable_pdf(pdf_file):
-    """Convert image-based PDF to searchable PDF"""
-    try:
-        # Convert PDF to images
-        pdf_bytes = io.BytesIO(pdf_file.getvalue())
-        images = convert_from_bytes(pdf_bytes.getvalue())
-        
-        # Create new PDF
-        output_pdf = fitz.open()
-        
-        for img in images:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_bytes = img_byte_arr.getvalue()
-            
-            # Create new PDF page
-            page = output_pdf.new_page(width=img.width, height=img.height)
-            
-            # Insert image
-            page.insert_image(page.rect, stream=img_bytes)
-            
-            # Perform OCR
-            text = perform_ocr_on_page(img)
-            
-            # Insert text layer
-            if text:
-                page.insert_text((0, 0), text)
-        
-        # Convert to bytes
-        output_bytes = io.BytesIO()
-        output_pdf.save(output_bytes)
-        output_pdf.close()
-        
-        return output_bytes.getvalue()
-    except Exception as e:
-        st.error(f"Error creating searchable PDF: {str(e)}")
-        return None
+@st.cache_resource
+def detection_executor():
+    return concurrent.futures.ThreadPoolExecutor(DETECTION_WORKERS)
+
+@st.cache_resource
+def detection_jobs():
+    """Background detection futures by (upload hash, mode, min face size, detector)"""
+    return {}
 
-def process_pdf_faces(pdf_file):
+def process_pdf_faces(doc_hash, pdf_data, face_detector, detection_mode="pyramid", min_face_size=DEFAULT_MIN_FACE_SIZE):
     results = []
     pdf_document = None
     try:
-        # Create searchable PDF if needed
-        pdf_bytes = io.BytesIO(pdf_file.getvalue())
-        pdf_document = fitz.open(stream=pdf_bytes)
-        
-        # Check if PDF needs OCR (by checking if it has text)
-        needs_ocr = True
-        for page in pdf_document:
-            if page.get_text().strip():
-                needs_ocr = False
-                break
-        
-        if needs_ocr:
-            st.info("Converting image-based PDF to searchable format...")
-            searchable_pdf = create_searchable_pdf(pdf_file)
-            if searchable_pdf:
-                pdf_document = fitz.open(stream=io.BytesIO(searchable_pdf))
-        
+        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
         total_pages = len(pdf_document)
-        
+
+        # Images reused across pages are only decoded and scanned once
+        xref_cache = {}
+
         for page_num in range(total_pages):
             page = pdf_document[page_num]
-            
-            # Convert PDF page to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Convert PIL image to numpy array
-            img_array = np.array(img)
-            
-            # Detect faces
-            face_locations = face_recognition.face_locations(img_array)
-            
+
+            # Detect faces, boxes come back in page coordinates
+            face_locations = detect_faces_on_page(
+                page, mode=detection_mode, zoom=PREVIEW_ZOOM, min_face_size=min_face_size,
+                detector=face_detector, xref_cache=xref_cache,
+                render=page_raster_cache.renderer(doc_hash)
+            )
+            page_rect = page.rect
+
             # Store results
             page_results = {
                 'page_number': page_num + 1,
                 'face_count': len(face_locations),
                 'faces': []
             }
-            
+
             for face_location in face_locations:
                 top, right, bottom, left = face_location
                 face_info = {
-                    'top': top / pix.height,
-                    'right': right / pix.width,
-                    'bottom': bottom / pix.height,
-                    'left': left / pix.width
+                    'top': (top - page_rect.y0) / page_rect.height,
+                    'right': (right - page_rect.x0) / page_rect.width,
+                    'bottom': (bottom - page_rect.y0) / page_rect.height,
+                    'left': (left - page_rect.x0) / page_rect.width
                 }
                 page_results['faces'].append(face_info)
-            
+
             results.append(page_results)
-        
+
         return {
             'status': 'success',
             'total_pages': total_pages,
             'pages': results
         }
-        
+
     except Exception as e:
         return {
             'status': 'error',
@@ -138,170 +107,186 @@ def process_pdf_faces(pdf_file):
         if pdf_document:
             pdf_document.close()
 
-def mask_faces_on_page(pdf_file, page_num, faces):
-    try:
-        # Create a bytes buffer
-        pdf_bytes = io.BytesIO(pdf_file.getvalue())
-        
-        # Open PDF and get specified page
-        pdf_document = fitz.open(stream=pdf_bytes)
-        page = pdf_document[page_num]
-        
-        # Convert page to image
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img_array = np.array(img)
-        
-        # Mask each face with a black rectangle
-        for face in faces:
-            top = int(face['top'] * pix.height)
-            right = int(face['right'] * pix.width)
-            bottom = int(face['bottom'] * pix.height)
-            left = int(face['left'] * pix.width)
-            
-            # Draw black rectangle over face
-            img_array[top:bottom, left:right] = [0, 0, 0]  # Black mask
-        
-        # Convert back to PIL Image and then to bytes
-        result_img = Image.fromarray(img_array)
-        img_byte_arr = io.BytesIO()
-        result_img.save(img_byte_arr, format='PNG')
-        img_bytes = img_byte_arr.getvalue()
-        
-        pdf_document.close()
-        return img_bytes
-        
-    except Exception as e:
-        st.error(f"Error masking faces: {str(e)}")
-        return None
+def run_detection(doc_hash, pdf_data, face_detector, detection_mode, min_face_size):
+    """
+    OCR scanned pages, then detect faces; runs on the detection executor
+
+    No Streamlit caching here, it needs the script thread. The job future
+    in detection_jobs is what memoizes the result.
+    """
+    searchable_pdf = build_searchable_pdf(pdf_data)
+    ocr_applied = searchable_pdf != pdf_data
+    if ocr_applied:
+        pdf_data = searchable_pdf
+        doc_hash = document_hash(searchable_pdf)
+    results = process_pdf_faces(doc_hash, pdf_data, face_detector, detection_mode, min_face_size)
+    return {'doc_hash': doc_hash, 'pdf_data': pdf_data, 'ocr_applied': ocr_applied, 'results': results}
+
+def submit_detection(job_key, pdf_data):
+    """Start detection for job_key unless it is already running or finished"""
+    jobs = detection_jobs()
+    if job_key in jobs:
+        return jobs[job_key]
+    finished = [key for key, job in jobs.items() if job.done()]
+    for old_key in finished[:max(0, len(jobs) - MAX_DETECTION_JOBS + 1)]:
+        del jobs[old_key]
+    doc_hash, detection_mode, min_face_size, detector = job_key
+    # The detector is loaded here, on the script thread, where cache_resource works
+    jobs[job_key] = detection_executor().submit(
+        run_detection, doc_hash, pdf_data, load_detector(detector), detection_mode, min_face_size
+    )
+    return jobs[job_key]
 
-def redact_text_on_page(pdf_file, page_num, text_patterns):
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_page_image(doc_hash, _pdf_data, page_num, zoom=PREVIEW_ZOOM):
+    return page_raster_cache.page_image(_pdf_data, page_num, zoom, doc_hash=doc_hash)
+
+def mask_faces_on_page(img_array, faces):
+    """Return a copy of a page render with the (normalized) face boxes blacked out"""
+    height, width = img_array.shape[:2]
+    boxes = [
+        (face['top'] * height, face['right'] * width, face['bottom'] * height, face['left'] * width)
+        for face in faces
+    ]
+    # One copy per page, every face is then filled in place on it
+    return fill_faces(img_array.copy(), boxes)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def masked_page_image(doc_hash, _pdf_data, page_num, faces):
+    """Page render with faces masked, independent of the text patterns"""
+    img_array = render_page_image(doc_hash, _pdf_data, page_num)
+    return mask_faces_on_page(img_array, faces) if faces else img_array
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def find_text_rects(doc_hash, _pdf_data, text_patterns, zoom=PREVIEW_ZOOM):
+    """Pixel rectangles of pattern matches on each page render, by page index"""
+    patterns = [p.strip() for p in text_patterns.split(',') if p.strip()]
+    matches = {}
+    if not patterns:
+        return matches
+    pdf_document = fitz.open(stream=_pdf_data, filetype="pdf")
     try:
-        # Create a bytes buffer
-        pdf_bytes = io.BytesIO(pdf_file.getvalue())
-        
-        # Open PDF and get specified page
-        pdf_document = fitz.open(stream=pdf_bytes)
-        page = pdf_document[page_num]
-        
-        # Split patterns and clean them
-        patterns = [p.strip() for p in text_patterns.split(',') if p.strip()]
-        
-        # Search and redact each pattern
-        for pattern in patterns:
-            text_instances = page.search_for(pattern)
-            for inst in text_instances:
-                # Draw black rectangle over the text
-                page.draw_rect(inst, color=(0, 0, 0), fill=(0, 0, 0))
-        
-        # Convert to image
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img_bytes = pix.tobytes("png")
-        
+        for page in pdf_document:
+            # Search on the page, the boxes are drawn on the cached render
+            to_pixels = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+            rects = [
+                tuple(fitz.IRect((inst * to_pixels).round()))
+                for pattern in patterns for inst in page.search_for(pattern)
+            ]
+            if rects:
+                matches[page.number] = rects
+    finally:
         pdf_document.close()
-        return img_bytes, len(text_instances) if text_instances else 0
-        
-    except Exception as e:
-        st.error(f"Error redacting text: {str(e)}")
-        return None, 0
+    return matches
+
+def redact_text_on_page(img_array, rects):
+    """Black out text match rectangles on a page render, returns (image, match count)"""
+    if not rects:
+        return img_array, 0
+    img_array = img_array.copy()
+    for x0, y0, x1, y1 in rects:
+        img_array[max(0, y0):y1, max(0, x0):x1] = 0
+    return img_array, len(rects)
+
+@st.fragment(run_every=1.0)
+def detection_progress(job):
+    """Poll a running detection job, rerunning the app once it finishes"""
+    if job.done():
+        st.rerun()
+    st.info("Detecting faces in the background, the preview stays usable meanwhile...")
 
 # File uploader
 uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
 
 if uploaded_file is not None:
-    # Initialize session state for PDF content
-    if 'pdf_content' not in st.session_state:
-        st.session_state.pdf_content = uploaded_file.getvalue()
-    
+    pdf_data = uploaded_file.getvalue()
+    upload_hash = document_hash(pdf_data)
+
     # Add text input for redaction patterns
     text_to_redact = st.text_input(
         "Enter text patterns to redact (comma-separated)",
         help="Example: John Doe, 123-45-6789, confidential"
     )
-    
+
+    # Face detection speed/recall trade-off
+    detection_mode = st.selectbox(
+        "Face detection mode",
+        DETECTION_MODES,
+        index=DETECTION_MODES.index("pyramid"),
+        help="pyramid detects on a downscaled render and refines candidates, full detects on the 2x render, "
+             "images only scans embedded images and skips text-only pages"
+    )
+    detector = st.selectbox(
+        "Face detector",
+        DETECTOR_BACKENDS,
+        index=DETECTOR_BACKENDS.index(DEFAULT_DETECTOR),
+        help="hog is accurate but slow on CPU, dnn needs a local model file, haar is the fastest"
+    )
+    min_face_size = st.slider(
+        "Smallest face to detect (page points)",
+        min_value=16.0,
+        max_value=200.0,
+        value=DEFAULT_MIN_FACE_SIZE,
+        help="Larger values are faster but miss smaller faces (pyramid mode only)"
+    )
+
     # Create columns for layout
     col1, col2 = st.columns(2)
-    
+
     with col1:
         st.write("### PDF Preview")
         try:
-            pdf_bytes = io.BytesIO(st.session_state.pdf_content)
-            pdf_document = fitz.open(stream=pdf_bytes)
-            first_page = pdf_document[0]
-            pix = first_page.get_pixmap(matrix=fitz.Matrix(1, 1))
-            img_bytes = pix.tobytes("png")
-            pdf_document.close()
-            st.image(img_bytes)
+            st.image(render_page_image(upload_hash, pdf_data, 0, zoom=1.0))
         except Exception as e:
             st.error(f"Error displaying preview: {str(e)}")
-    
+
     with col2:
         st.write("### Detection Results")
         if st.button("Process PDF (Mask Faces & Redact Text)"):
-            with st.spinner("Processing PDF..."):
-                # First check if PDF needs OCR
-                pdf_bytes = io.BytesIO(uploaded_file.getvalue())
-                pdf_document = fitz.open(stream=pdf_bytes)
-                
-                needs_ocr = True
-                for page in pdf_document:
-                    if page.get_text().strip():
-                        needs_ocr = False
-                        break
-                pdf_document.close()
-                
-                if needs_ocr:
-                    st.info("Converting image-based PDF to searchable format...")
-                    searchable_pdf = create_searchable_pdf(uploaded_file)
-                    if searchable_pdf:
-                        uploaded_file = io.BytesIO(searchable_pdf)
-                        st.session_state.pdf_content = searchable_pdf
-                
-                # Process faces and text
-                results = process_pdf_faces(uploaded_file)
-                
-                if results['status'] == 'success':
-                    total_faces = sum(page['face_count'] for page in results['pages'])
-                    st.success(f"Found {total_faces} faces across {results['total_pages']} pages")
-                    
-                    for page in results['pages']:
-                        with st.expander(f"Page {page['page_number']}"):
-                            processed_img = None
-                            
-                            # First mask faces if any found
-                            if page['face_count'] > 0:
-                                processed_img = mask_faces_on_page(
-                                    uploaded_file,
-                                    page['page_number'] - 1,
-                                    page['faces']
-                                )
-                                st.info(f"Masked {page['face_count']} faces on this page")
-                            
-                            # Then apply text redaction if patterns provided
-                            if text_to_redact:
-                                img_bytes, redaction_count = redact_text_on_page(
-                                    uploaded_file if processed_img is None else io.BytesIO(processed_img),
-                                    page['page_number'] - 1,
-                                    text_to_redact
-                                )
-                                if redaction_count > 0:
-                                    st.info(f"Redacted {redaction_count} text instances on this page")
-                                    processed_img = img_bytes
-                            
-                            # Display the processed page
-                            if processed_img:
-                                st.image(processed_img)
-                            else:
-                                # If no processing was needed, show original page
-                                pdf_bytes = io.BytesIO(uploaded_file.getvalue())
-                                pdf_document = fitz.open(stream=pdf_bytes)
-                                page_obj = pdf_document[page['page_number'] - 1]
-                                pix = page_obj.get_pixmap(matrix=fitz.Matrix(2, 2))
-                                st.image(pix.tobytes("png"))
-                                pdf_document.close()
-                else:
-                    st.error(f"Error processing PDF: {results['message']}")
+            job_key = (upload_hash, detection_mode, min_face_size, detector)
+            submit_detection(job_key, pdf_data)
+            st.session_state.detection_job = job_key
+
+        # Results stay on screen across reruns, e.g. while typing new patterns
+        job_key = st.session_state.get('detection_job')
+        job = detection_jobs().get(job_key) if job_key and job_key[0] == upload_hash else None
+        if job is not None and not job.done():
+            detection_progress(job)
+        elif job is not None:
+            try:
+                detection = job.result()
+            except Exception as e:
+                detection = {'results': {'status': 'error', 'message': str(e)}}
+            results = detection['results']
+
+            if results['status'] == 'success':
+                if detection['ocr_applied']:
+                    st.info("Added an OCR text layer to the scanned pages")
+                total_faces = sum(page['face_count'] for page in results['pages'])
+                st.success(f"Found {total_faces} faces across {results['total_pages']} pages")
+
+                # Only this step depends on the patterns, faces and renders are cached
+                text_rects = find_text_rects(detection['doc_hash'], detection['pdf_data'], text_to_redact)
+
+                for page in results['pages']:
+                    page_index = page['page_number'] - 1
+                    with st.expander(f"Page {page['page_number']}"):
+                        page_img = masked_page_image(
+                            detection['doc_hash'], detection['pdf_data'], page_index, page['faces']
+                        )
+                        if page['face_count'] > 0:
+                            st.info(f"Masked {page['face_count']} faces on this page")
+
+                        page_img, redaction_count = redact_text_on_page(page_img, text_rects.get(page_index))
+                        if redaction_count > 0:
+                            st.info(f"Redacted {redaction_count} text instances on this page")
+
+                        st.image(page_img)
+            else:
+                # Let the next click retry instead of replaying the failure
+                detection_jobs().pop(job_key, None)
+                st.error(f"Error processing PDF: {results['message']}")
 
 # Add footer
 st.markdown("---")
-st.markdown("Made with ❤️ using Streamlit")
\ No newline at end of file
+st.markdown("Made with ❤️ using Streamlit")
@@ -0,0 +1,119 @@
+"""Tests for processed document expiry, eviction and page downloads"""
+import importlib.util
+import os
+
+import fitz
+import pytest
+
+import document_store
+from document_store import ProcessedDocumentStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(document_store.time, "monotonic", clock)
+    return clock
+
+
+def sample_pdf(pages=2):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=100, height=100)
+    return doc.tobytes()
+
+
+def test_documents_expire_after_last_access(clock):
+    store = ProcessedDocumentStore(ttl=60)
+    document_id = store.add(sample_pdf(), [[], []])
+
+    clock.now += 50
+    assert store.get(document_id) is not None
+    # The lookup renewed it
+    clock.now += 50
+    assert store.get(document_id) is not None
+    clock.now += 61
+    assert store.get(document_id) is None
+
+
+def test_least_recently_used_document_is_dropped(clock):
+    pdf = sample_pdf()
+    store = ProcessedDocumentStore(max_bytes=2 * len(pdf))
+    first = store.add(pdf, [[], []])
+    second = store.add(pdf, [[], []])
+    assert store.get(first) is not None  # second is now the oldest
+    store.add(pdf, [[], []])
+
+    assert store.get(second) is None
+    assert store.get(first) is not None
+
+
+def test_newest_document_is_kept_over_the_cap(clock):
+    store = ProcessedDocumentStore(max_bytes=10)
+    document_id = store.add(sample_pdf(), [[], []])
+    assert store.get(document_id) is not None
+
+
+def test_page_png_is_rendered_once(clock):
+    store = ProcessedDocumentStore()
+    document = store.get(store.add(sample_pdf(), [[(10, 60, 60, 10)], []]))
+    png = store.page_png(document, 1, mask_mode="fill")
+    assert png.startswith(b"\x89PNG")
+    assert store.page_png(document, 1, mask_mode="fill") is png
+    assert store.page_png(document, 1, mask_mode="blur") is not png
+    assert document.nbytes == len(document.pdf_data) + sum(
+        len(page) for page in document.pages.values()
+    )
+
+
+def test_etag_depends_on_page_zoom_and_mode():
+    document = document_store.ProcessedDocument(sample_pdf(), [[], []])
+    etag = document.etag(1, 2.0, "blur")
+    assert etag == document.etag(1, 2.0, "blur")
+    assert len({etag, document.etag(2, 2.0, "blur"), document.etag(1, 1.0, "blur"),
+                document.etag(1, 2.0, "fill")}) == 4
+
+
+@pytest.fixture
+def face_app():
+    # Loaded from its path, "app" is the Guardian service on the test path
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app.py")
+    spec = importlib.util.spec_from_file_location("face_detection_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_download_revalidation_skips_rendering(face_app, monkeypatch):
+    document_id = face_app.document_store.add(sample_pdf(), [[], []])
+    client = face_app.app.test_client()
+    url = "/pdf/download/1"
+
+    response = client.get(url, query_string={"document_id": document_id})
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    etag = response.headers["ETag"]
+    assert "private" in response.headers["Cache-Control"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rendered on a revalidation")
+
+    monkeypatch.setattr(face_app.document_store, "page_png", fail)
+    response = client.get(
+        url, query_string={"document_id": document_id}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = client.get(url, query_string={"document_id": "unknown"})
+    assert response.status_code == 404
+    response = client.get("/pdf/download/3", query_string={"document_id": document_id})
+    assert response.status_code == 400
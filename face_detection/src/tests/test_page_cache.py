@@ -0,0 +1,67 @@
+"""Tests for the shared page raster cache"""
+import fitz
+import pytest
+
+from page_cache import PageRasterCache
+
+
+def sample_pdf(pages=2):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=100, height=100)
+    return doc.tobytes()
+
+
+def render_bytes(zoom=1.0):
+    """Size of one RGB render of a 100x100 point page"""
+    side = round(100 * zoom)
+    return side * side * 3
+
+
+def test_page_image_renders_once():
+    cache = PageRasterCache()
+    pdf = sample_pdf()
+    first = cache.page_image(pdf, 0, doc_hash="doc")
+    assert cache.page_image(pdf, 0, doc_hash="doc") is first
+    assert first.shape == (100, 100, 3)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    # Other zooms and pages are separate entries
+    assert cache.page_image(pdf, 0, zoom=2.0, doc_hash="doc").shape == (200, 200, 3)
+    cache.page_image(pdf, 1, doc_hash="doc")
+    assert cache.stats()["entries"] == 3
+
+
+def test_cached_renders_are_read_only():
+    image = PageRasterCache().page_image(sample_pdf(), 0)
+    with pytest.raises(ValueError):
+        image[0, 0] = 0
+
+
+def test_lru_eviction_by_bytes():
+    pdf = sample_pdf(3)
+    cache = PageRasterCache(max_bytes=2 * render_bytes())
+    cache.page_image(pdf, 0, doc_hash="doc")
+    cache.page_image(pdf, 1, doc_hash="doc")
+    cache.page_image(pdf, 0, doc_hash="doc")  # page 0 is now the most recent
+    cache.page_image(pdf, 2, doc_hash="doc")
+
+    assert cache.get(("doc", 1, 1.0)) is None
+    assert cache.get(("doc", 0, 1.0)) is not None
+    assert cache.stats()["bytes"] == 2 * render_bytes()
+
+
+def test_render_larger_than_cache_is_not_kept():
+    cache = PageRasterCache(max_bytes=render_bytes())
+    image = cache.page_image(sample_pdf(), 0, zoom=2.0, doc_hash="doc")
+    assert image.shape == (200, 200, 3)
+    assert cache.stats()["entries"] == 0
+
+
+def test_renderer_shares_entries_with_page_image():
+    pdf = sample_pdf()
+    cache = PageRasterCache()
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    rendered = cache.renderer("doc")(doc[1], 2.0)
+    assert cache.page_image(pdf, 1, zoom=2, doc_hash="doc") is rendered
@@ -0,0 +1,37 @@
+"""Tests for document-level text redaction"""
+import fitz
+
+from text_redactor import parse_patterns, redact_pdf_text
+
+
+def sample_pdf():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Jane Doe, SSN 123-45-6789")
+    doc.new_page().insert_text((72, 72), "Nothing to see")
+    doc.new_page().insert_text((72, 72), "jane doe again\nand JANE\nDOE")
+    return doc.tobytes()
+
+
+def test_parse_patterns():
+    assert parse_patterns(" a, b ,,") == ["a", "b"]
+    assert parse_patterns(["a", " ", None, "b "]) == ["a", "b"]
+    assert parse_patterns(None) == []
+
+
+def test_redacts_every_page_case_insensitively():
+    counts, pdf = redact_pdf_text(sample_pdf(), "Jane Doe, 123-45-6789")
+    # A match across a line break gets one box per line
+    assert counts == [2, 0, 3]
+
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    text = "".join(page.get_text() for page in doc).lower()
+    assert "jane doe" not in text
+    assert "123-45-6789" not in text
+    assert "nothing to see" in text
+    assert "again" in text
+
+
+def test_no_patterns_leaves_document_unchanged():
+    counts, pdf = redact_pdf_text(sample_pdf(), " , ")
+    assert counts == [0, 0, 0]
+    assert "Jane Doe" in fitz.open(stream=pdf, filetype="pdf")[0].get_text()
@@ -0,0 +1,61 @@
+"""Document-level text redaction, opening each PDF once"""
+import io
+import fitz
+
+
+def parse_patterns(text_patterns):
+    """Accept a comma-separated string or a list and return clean patterns"""
+    if not text_patterns:
+        return []
+    if isinstance(text_patterns, str):
+        text_patterns = text_patterns.split(',')
+    return [p.strip() for p in text_patterns if p and p.strip()]
+
+
+def _normalize(text):
+    # search_for is case-insensitive and matches across line breaks
+    return " ".join(text.split()).lower()
+
+
+def redact_text_in_document(doc, patterns, fill=(0, 0, 0)):
+    """
+    Redact all patterns on all pages of an open document in one pass
+
+    Each page's text is extracted once into a TextPage; it is used both to
+    skip patterns that cannot occur on the page and for search_for, so
+    pages without matches are never searched. Returns the number of
+    redactions on each page.
+    """
+    needles = [(p, _normalize(p)) for p in parse_patterns(patterns)]
+
+    counts = [0] * len(doc)
+    if not needles:
+        return counts
+
+    for page_num, page in enumerate(doc):
+        textpage = page.get_textpage()
+        page_text = _normalize(textpage.extractText())
+        hits = [p for p, needle in needles if needle in page_text]
+        if not hits:
+            continue
+
+        for pattern in hits:
+            instances = page.search_for(pattern, textpage=textpage)
+            counts[page_num] += len(instances)
+            for inst in instances:
+                page.add_redact_annot(inst, fill=fill)
+        if counts[page_num]:
+            page.apply_redactions()
+    return counts
+
+
+def redact_pdf_text(pdf_data, patterns, fill=(0, 0, 0)):
+    """Redact patterns in PDF bytes, returning (per-page counts, redacted PDF bytes)"""
+    doc = fitz.open(stream=pdf_data, filetype="pdf")
+    try:
+        counts = redact_text_in_document(doc, patterns, fill)
+        output = io.BytesIO()
+        doc.save(output, garbage=3, deflate=True)
+        return counts, output.getvalue()
+    finally:
+        doc.close()
@@ -1,16 +1,26 @@
 """REST API server for analyzer."""
 
+import io
 import json
 import logging
-import datetime
+from datetime import datetime
 import os
+import tempfile
 import time
+import zipfile
 from logging.config import fileConfig
 from pathlib import Path
 from typing import Tuple
 import numpy as np
 
-from flask import Flask, Response, jsonify, request, send_file
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    send_file,
+)
 from flask_cors import CORS
 from guardian_analyzer import AnalyzerEngine, AnalyzerEngineProvider, AnalyzerRequest
 from werkzeug.exceptions import HTTPException
@@ -20,7 +30,19 @@ from werkzeug.utils import secure_filename
 from new_pdf_redactor import GuardianPDFRedactor
 
 # from adv_pdf_redactor import AdvancedPDFRedactor
-from image_redactor import PresidioImageRedactor
+from image_redactor import PresidioImageRedactor, REDACTION_MODES
+from ocr_cache import OCRCache
+from pdf_ocr import DEFAULT_OCR_DPI, PDFPageOCR
+from document_redactor import DocumentRedactor
+from drm_access import DRMAccessIndex
+from drm_metadata_store import DRMMetadataStore
+from drm_pdf_manager import DRMPDFManager
+from upload_ingest import ingest_upload
+from batch_image_redactor import (
+    BatchImageRedactor,
+    is_supported_image,
+    zip_items,
+)
 
 import fitz
 
@@ -28,6 +50,9 @@ PORT = "3000"
 
 LOGGING_CONF_FILE = "logging.ini"
 
+# Redacted outputs up to this size stay in memory, larger ones spill to disk
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
 WELCOME_MESSAGE = r"""
  ____         __       ____                     _
 / ___|  __ _ / _| ___ / ___|_   _  __ _ _ __ __| (_) __ _ _ __  ___
@@ -59,11 +84,52 @@ class Server:
             nlp_engine_conf_file=nlp_engine_conf_file,
             recognizer_registry_conf_file=recognizer_registry_conf_file,
         ).create_engine()
-        self.pdf_redactor = GuardianPDFRedactor(analyzer_engine=self.engine)
+        self.ocr_cache = OCRCache(
+            max_bytes=int(os.environ.get("OCR_CACHE_MAX_MB", 64)) * 1024 * 1024,
+            cache_dir=os.environ.get("OCR_CACHE_DIR"),
+            max_disk_bytes=int(os.environ.get("OCR_CACHE_MAX_DISK_MB", 512))
+            * 1024
+            * 1024,
+        )
+        self.pdf_redactor = GuardianPDFRedactor(
+            analyzer_engine=self.engine,
+            page_ocr=PDFPageOCR(
+                ocr_cache=self.ocr_cache,
+                dpi=int(os.environ.get("PDF_OCR_DPI", DEFAULT_OCR_DPI)),
+            ),
+        )
         # self.pdf_redactor = AdvancedPDFRedactor()
+        self.document_redactor = DocumentRedactor(
+            self.pdf_redactor,
+            max_workers=int(os.environ.get("DOCUMENT_REDACT_WORKERS", 0)) or None,
+        )
+        drm_store = DRMMetadataStore(
+            db_path=os.environ.get("DRM_DB_PATH"),
+            cache_size=int(os.environ.get("DRM_CACHE_SIZE", 10000)),
+            cache_ttl=float(os.environ.get("DRM_CACHE_TTL", 30)),
+        )
+        drm_access = DRMAccessIndex(
+            drm_store,
+            sweep_interval=float(os.environ.get("DRM_SWEEP_INTERVAL", 5)),
+            max_age=int(os.environ.get("DRM_VERIFY_MAX_AGE", 10)),
+        )
+        drm_access.start()
+        self.drm_manager = DRMPDFManager(
+            api_url=os.environ.get(
+                "DRM_API_URL", f"http://localhost:{os.environ.get('PORT', PORT)}"
+            ),
+            metadata_store=drm_store,
+            access_index=drm_access,
+        )
         print(WELCOME_MESSAGE)
 
-        self.image_redactor = PresidioImageRedactor()
+        self.image_redactor = PresidioImageRedactor(
+            analyzer_engine=self.engine, ocr_cache=self.ocr_cache
+        )
+        self.batch_image_redactor = BatchImageRedactor(
+            self.image_redactor,
+            max_workers=int(os.environ.get("IMAGE_BATCH_WORKERS", 0)) or None,
+        )
 
         @self.app.route("/health")
         def health() -> str:
@@ -230,6 +296,75 @@ class Server:
                 )
                 return jsonify(error=e.args[0]), 500
 
+        @self.app.route("/ocr-cache/stats", methods=["GET"])
+        def ocr_cache_stats() -> Tuple[str, int]:
+            """Return OCR cache hit-rate and size metrics."""
+            return jsonify(self.ocr_cache.stats()), 200
+
+        @self.app.route("/redact-document", methods=["POST"])
+        def redact_document():
+            """Redact text PII and faces of a PDF in one pass, returns the PDF"""
+            try:
+                if "file" not in request.files:
+                    return jsonify({"error": "No file provided"}), 400
+
+                file = request.files["file"]
+                if file.filename == "":
+                    return jsonify({"error": "No file selected"}), 400
+
+                language = request.form.get("language", "en")
+                ocr_language = request.form.get("ocr_language", "eng")
+                redact_faces = request.form.get("redact_faces", "true").lower() != "false"
+
+                try:
+                    entities = json.loads(request.form.get("entities", "[]"))
+                    if not isinstance(entities, list):
+                        return jsonify({"error": "Entities must be a list"}), 400
+                except json.JSONDecodeError:
+                    return jsonify({"error": "Invalid entities JSON"}), 400
+
+                timestamp = int(time.time())
+                input_filename = secure_filename(file.filename)
+                input_path = os.path.join("temp/input", f"{timestamp}_{input_filename}")
+                output_filename = f"redacted_{timestamp}_{input_filename}"
+                os.makedirs(os.path.dirname(input_path), exist_ok=True)
+
+                g.upload = ingest_upload(file, input_path)
+                try:
+                    result = self.document_redactor.redact_document(
+                        pdf_path=input_path,
+                        language=language,
+                        entities=entities,
+                        additional_keywords=request.form.getlist("additional_keywords"),
+                        custom_regex=request.form.getlist("custom_regex"),
+                        ocr_language=ocr_language,
+                        redact_faces=redact_faces,
+                        return_bytes=True,
+                    )
+                    # Sent from memory, nothing is left behind in temp/output
+                    pdf_bytes = result.pop("pdf_bytes")
+                    self.logger.info(f"Document redaction completed: {result}")
+
+                    response = send_file(
+                        io.BytesIO(pdf_bytes),
+                        as_attachment=True,
+                        download_name=output_filename,
+                        mimetype="application/pdf",
+                    )
+                    response.headers["X-Text-Redactions"] = str(result["text_redactions"])
+                    response.headers["X-Faces-Redacted"] = str(result["faces_redacted"])
+                    return response
+                finally:
+                    if os.path.exists(input_path):
+                        os.remove(input_path)
+
+            except Exception as e:
+                self.logger.error(f"Error redacting document: {e}")
+                return (
+                    jsonify({"error": str(e), "message": "Failed to redact document"}),
+                    500,
+                )
+
         @self.app.route("/redact-pdf", methods=["POST"])
         def redact_pdf():
             try:
@@ -242,6 +377,7 @@ class Server:
 
                 # Get parameters
                 language = request.form.get("language", "en")
+                ocr_language = request.form.get("ocr_language", "eng")
                 redaction_style = request.form.get("redaction_style", "blackbox")
 
                 if redaction_style not in ["blackbox", "label"]:
@@ -266,7 +402,7 @@ class Server:
                 output_path = os.path.join("temp/output", output_filename)
 
                 # Save uploaded file
-                file.save(input_path)
+                g.upload = ingest_upload(file, input_path)
 
                 try:
                     # Process the PDF
@@ -278,6 +414,7 @@ class Server:
                         custom_regex=custom_regex,
                         entities=entities,
                         redaction_style=redaction_style,
+                        ocr_language=ocr_language,
                     )
 
                     self.logger.info(f"Redaction completed: {result}")
@@ -336,7 +473,7 @@ class Server:
 
                 # Save uploaded file
                 os.makedirs(os.path.dirname(input_path), exist_ok=True)
-                file.save(input_path)
+                g.upload = ingest_upload(file, input_path)
 
                 try:
                     # Encrypt the PDF
@@ -442,12 +579,16 @@ class Server:
                     return jsonify({"error": "No file selected"}), 400
 
                 # Validate file type
-                allowed_extensions = {"png", "jpg", "jpeg"}
+                allowed_extensions = {"png", "jpg", "jpeg", "tif", "tiff"}
                 if not file.filename.lower().endswith(tuple(allowed_extensions)):
                     return jsonify({"error": "Invalid file type"}), 400
 
                 # Get parameters
                 language = request.form.get("language", "en")
+                ocr_language = request.form.get("ocr_language", "eng")
+                redaction_mode = request.form.get("redaction_mode", "fill")
+                if redaction_mode not in REDACTION_MODES:
+                    return jsonify({"error": "Invalid redaction mode"}), 400
 
                 # Parse and validate entities
                 try:
@@ -462,30 +603,56 @@ class Server:
                 input_filename = secure_filename(file.filename)
                 input_path = os.path.join("temp/input", f"{timestamp}_{input_filename}")
                 output_filename = f"redacted_{timestamp}_{input_filename}"
-                output_path = os.path.join("temp/output", output_filename)
 
                 # Ensure directories exist
                 os.makedirs(os.path.dirname(input_path), exist_ok=True)
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
                 # Save uploaded file
-                file.save(input_path)
+                g.upload = ingest_upload(file, input_path)
 
                 try:
-                    # Process the image
+                    if input_filename.lower().endswith((".tif", ".tiff")):
+                        # Multi-page TIFFs are streamed frame by frame to a
+                        # temporary file that is gone once the response is closed
+                        output = tempfile.SpooledTemporaryFile(
+                            max_size=SPOOL_MAX_SIZE
+                        )
+                        try:
+                            result = self.image_redactor.redact_multiframe_image(
+                                image_path=input_path,
+                                output_path=output,
+                                language=language,
+                                ocr_language=ocr_language,
+                                entities=entities,
+                                redaction_mode=redaction_mode,
+                            )
+                            output.seek(0)
+                        except Exception:
+                            output.close()
+                            raise
+                        return send_file(
+                            output,
+                            as_attachment=True,
+                            download_name=output_filename,
+                            mimetype=result["mimetype"],
+                        )
+
+                    # Process the image, keeping the redacted output in memory
                     result = self.image_redactor.redact_image(
                         image_path=input_path,
-                        output_path=output_path,
                         language=language,
+                        ocr_language=ocr_language,
                         entities=entities,
+                        redaction_mode=redaction_mode,
+                        return_bytes=True,
                     )
 
                     # Return the redacted image
                     return send_file(
-                        output_path,
+                        io.BytesIO(result["image_bytes"]),
                         as_attachment=True,
                         download_name=output_filename,
-                        mimetype=f"image/{output_filename.split('.')[-1].lower()}",
+                        mimetype=result["mimetype"],
                     )
 
                 finally:
@@ -493,9 +660,6 @@ class Server:
                     try:
                         if os.path.exists(input_path):
                             os.remove(input_path)
-                        if os.path.exists(output_path):
-                            # Only remove after sending file
-                            pass
                     except Exception as e:
                         self.logger.warning(f"Error cleaning up temporary files: {e}")
 
@@ -506,6 +670,96 @@ class Server:
                     500,
                 )
 
+        @self.app.route("/redact-images", methods=["POST"])
+        def redact_images():
+            """Redact a batch of images, streaming back a zip archive."""
+            try:
+                files = [
+                    f for f in request.files.getlist("files") if f.filename != ""
+                ]
+                archive = request.files.get("archive")
+                if not files and (archive is None or archive.filename == ""):
+                    return jsonify({"error": "No files provided"}), 400
+
+                for f in files:
+                    if not is_supported_image(f.filename):
+                        return (
+                            jsonify({"error": f"Invalid file type: {f.filename}"}),
+                            400,
+                        )
+
+                # Get parameters
+                language = request.form.get("language", "en")
+                ocr_language = request.form.get("ocr_language", "eng")
+                redaction_mode = request.form.get("redaction_mode", "fill")
+                if redaction_mode not in REDACTION_MODES:
+                    return jsonify({"error": "Invalid redaction mode"}), 400
+
+                # Parse and validate entities
+                try:
+                    entities = json.loads(request.form.get("entities", "[]"))
+                    if not isinstance(entities, list):
+                        return jsonify({"error": "Entities must be a list"}), 400
+                except json.JSONDecodeError:
+                    return jsonify({"error": "Invalid entities JSON"}), 400
+
+                # The archive is checked before the response starts, a bad
+                # one must not turn into a 200 with a broken zip body
+                members = []
+                if archive is not None and archive.filename != "":
+                    try:
+                        members = zip_items(archive.stream)
+                    except zipfile.BadZipFile:
+                        return jsonify({"error": "Invalid zip archive"}), 400
+                    if not members and not files:
+                        return jsonify({"error": "No images found in archive"}), 400
+
+                # Flask closes the request's files when the view returns,
+                # before the body is streamed, so the upload streams are taken
+                # over here and closed once the archive is done
+                streams = []
+                for f in files + ([archive] if members else []):
+                    streams.append(f.stream)
+                    f.stream = io.BytesIO()
+
+                # Uploads are read lazily by the worker that redacts them
+                items = [
+                    (secure_filename(f.filename), stream.read)
+                    for f, stream in zip(files, streams)
+                ]
+                items.extend(members)
+
+                def chunks():
+                    try:
+                        yield from self.batch_image_redactor.iter_archive(
+                            items,
+                            language=language,
+                            ocr_language=ocr_language,
+                            entities=entities,
+                            redaction_mode=redaction_mode,
+                        )
+                    finally:
+                        for stream in streams:
+                            stream.close()
+
+                timestamp = int(time.time())
+                return Response(
+                    chunks(),
+                    mimetype="application/zip",
+                    headers={
+                        "Content-Disposition": (
+                            f"attachment; filename=redacted_{timestamp}.zip"
+                        )
+                    },
+                )
+
+            except Exception as e:
+                self.logger.error(f"Error processing image batch: {e}")
+                return (
+                    jsonify({"error": str(e), "message": "Failed to process images"}),
+                    500,
+                )
+
         @self.app.route("/analyze-pdf", methods=["POST"])
         def analyze_pdf():
             """Execute analyzer on PDF content."""
@@ -533,7 +787,7 @@ class Server:
 
                 # Save uploaded file
                 os.makedirs(os.path.dirname(input_path), exist_ok=True)
-                file.save(input_path)
+                g.upload = ingest_upload(file, input_path)
 
                 try:
                     # Extract text from PDF
@@ -614,6 +868,7 @@ class Server:
 
                 # Get optional parameters
                 redaction_style = request.form.get("redaction_style", "blackbox")
+                ocr_language = request.form.get("ocr_language", "eng")
                 if redaction_style not in ["blackbox", "label"]:
                     return jsonify({"error": "Invalid redaction style"}), 400
 
@@ -629,7 +884,7 @@ class Server:
                 os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
                 # Save uploaded file
-                file.save(input_path)
+                g.upload = ingest_upload(file, input_path)
 
                 try:
                     # Process the PDF with only string redaction
@@ -638,6 +893,7 @@ class Server:
                         output_path=output_path,
                         strings_to_redact=strings_to_redact,
                         redaction_style=redaction_style,
+                        ocr_language=ocr_language,
                     )
 
                     # Return the redacted PDF file
@@ -685,23 +941,26 @@ class Server:
                 timestamp = int(time.time())
                 input_filename = secure_filename(file.filename)
                 input_path = os.path.join("temp/input", f"{timestamp}_{input_filename}")
-                output_path = os.path.join(
-                    "temp/output", f"drm_{timestamp}_{input_filename}"
-                )
 
                 os.makedirs(os.path.dirname(input_path), exist_ok=True)
-                file.save(input_path)
-
-                # Create DRM PDF
-                result = self.drm_manager.create_drm_pdf(
-                    input_path=input_path,
-                    output_path=output_path,
-                    owner_id=owner_id,
-                    expiry_date=expiry_datetime,
-                )
+                g.upload = ingest_upload(file, input_path)
+
+                # Create DRM PDF, sent from memory so temp/output stays empty
+                try:
+                    result = self.drm_manager.create_drm_pdf(
+                        input_path=input_path,
+                        output_path=None,
+                        owner_id=owner_id,
+                        expiry_date=expiry_datetime,
+                        original_hash=g.upload.sha256,
+                        return_bytes=True,
+                    )
+                finally:
+                    if os.path.exists(input_path):
+                        os.remove(input_path)
 
                 return send_file(
-                    result["output_path"],
+                    io.BytesIO(result["pdf_bytes"]),
                     as_attachment=True,
                     download_name=f"drm_{input_filename}",
                     mimetype="application/pdf",
@@ -726,6 +985,25 @@ class Server:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
+        @self.app.route("/revoke-pdfs", methods=["POST"])
+        def revoke_pdfs():
+            """Revoke all documents of an owner, or the listed doc_ids of that owner"""
+            try:
+                data = request.get_json() or {}
+                owner_id = data.get("owner_id")
+                doc_ids = data.get("doc_ids")
+
+                if not owner_id:
+                    return jsonify({"error": "Owner ID required"}), 400
+                if doc_ids is not None and not isinstance(doc_ids, list):
+                    return jsonify({"error": "Document IDs must be a list"}), 400
+
+                result = self.drm_manager.revoke_access_bulk(owner_id, doc_ids)
+                return jsonify(result)
+
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+
         @self.app.route("/verify", methods=["GET"])
         def verify_pdf_access():
             try:
@@ -733,28 +1011,44 @@ class Server:
                 if not doc_id:
                     return jsonify({"error": "Document ID required"}), 400
 
-                # Get metadata from storage
-                metadata = self.drm_manager._get_metadata(doc_id)
-
-                if not metadata:
-                    return jsonify({"error": "Document not found"}), 404
-
-                # Check if access is revoked
-                if metadata["status"] != "active":
-                    return jsonify({"error": "Access revoked"}), 403
-
-                # Check expiry if set
-                if metadata.get("expiry_date"):
-                    expiry = datetime.fromisoformat(metadata["expiry_date"])
-                    if datetime.now() > expiry:
-                        return jsonify({"error": "Document expired"}), 403
-
-                return jsonify({"status": "active"}), 200
+                # No store access or date parsing for revoked/expired/cached documents
+                decision = self.drm_manager.verify_access(doc_id)
+                status = decision["status"]
+
+                if status == "active":
+                    response = jsonify({"status": "active"})
+                elif status == "not_found":
+                    response = jsonify({"error": "Document not found"})
+                    response.status_code = 404
+                elif status == "expired":
+                    response = jsonify({"error": "Document expired"})
+                    response.status_code = 403
+                else:
+                    response = jsonify({"error": "Access revoked"})
+                    response.status_code = 403
+
+                if decision["max_age"] > 0:
+                    response.set_etag(decision["etag"])
+                    response.cache_control.public = True
+                    response.cache_control.max_age = decision["max_age"]
+                    if status == "active":
+                        return response.make_conditional(request)
+                    return response
+                response.cache_control.no_cache = True
+                return response
 
             except Exception as e:
                 print(f"Error verifying PDF access: {str(e)}")
                 return jsonify({"error": str(e)}), 500
 
+        @self.app.after_request
+        def add_upload_headers(response):
+            # Size, hash and page count of the upload, from the single ingest pass
+            upload = g.get("upload")
+            if upload is not None:
+                response.headers.update(upload.headers())
+            return response
+
         @self.app.errorhandler(HTTPException)
         def http_exception(e):
             return jsonify(error=e.description), e.code
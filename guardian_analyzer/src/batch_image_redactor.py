@@ -0,0 +1,125 @@
+import os
+import json
+import zipfile
+import logging
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from image_redactor import PresidioImageRedactor, IMAGE_FORMATS
+
+logger = logging.getLogger("guardian-analyzer")
+
+# (name, loader) pairs - the loader returns the raw image bytes when called
+BatchItem = Tuple[str, Callable[[], bytes]]
+
+
+class _StreamBuffer:
+    """Write-only sink that lets zipfile emit an archive in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def is_supported_image(name: str) -> bool:
+    """Check whether a file name has an image extension we can redact"""
+    return os.path.splitext(name)[1].lower() in IMAGE_FORMATS
+
+
+def zip_items(archive) -> List[BatchItem]:
+    """
+    The redactable images contained in a zip archive
+
+    The central directory is read here, so an archive that is not a valid
+    zip raises zipfile.BadZipFile before any response is started. Member
+    data is only read and decompressed by each item's loader.
+    """
+    zf = zipfile.ZipFile(archive)
+    return [
+        (info.filename, (lambda info=info: zf.read(info)))
+        for info in zf.infolist()
+        if not info.is_dir() and is_supported_image(info.filename)
+    ]
+
+
+class BatchImageRedactor:
+    def __init__(self, image_redactor: PresidioImageRedactor, max_workers: int = None):
+        """
+        Redacts batches of images concurrently and streams the results as a zip
+        """
+        self.image_redactor = image_redactor
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 4)
+
+    def _redact_one(
+        self, index: int, name: str, loader: Callable[[], bytes], options: Dict[str, Any]
+    ) -> Tuple[str, Dict[str, Any], bytes]:
+        """Redact a single batch item, never raising so the batch keeps going"""
+        base_name = f"{index:04d}_{os.path.basename(name)}"
+        manifest = {"index": index, "source": name}
+        try:
+            result = self.image_redactor.redact_image_bytes(
+                loader(), image_format=os.path.splitext(name)[1], **options
+            )
+            image_bytes = result.pop("image_bytes")
+            manifest.update(result)
+            manifest["output"] = base_name
+            return base_name, manifest, image_bytes
+        except Exception as e:
+            logger.error(f"Error redacting batch image {name}: {e}")
+            manifest.update({"status": "error", "error": str(e)})
+            return base_name, manifest, None
+
+    def iter_archive(self, items: Iterable[BatchItem], **options) -> Iterator[bytes]:
+        """
+        Redact items concurrently and yield a zip archive chunk by chunk
+
+        Each image is written as soon as it finishes, followed by a
+        "<name>.json" manifest entry. At most 2 * max_workers images are held
+        in memory at any time.
+        """
+        buffer = _StreamBuffer()
+        max_pending = self.max_workers * 2
+
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive, \
+                concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            pending = set()
+            items = iter(enumerate(items))
+
+            while True:
+                # Keep the pool fed without reading the whole batch up front
+                for index, (name, loader) in items:
+                    pending.add(
+                        executor.submit(self._redact_one, index, name, loader, options)
+                    )
+                    if len(pending) >= max_pending:
+                        break
+
+                if not pending:
+                    break
+
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    base_name, manifest, image_bytes = future.result()
+                    if image_bytes is not None:
+                        archive.writestr(base_name, image_bytes)
+                    archive.writestr(
+                        f"{base_name}.json",
+                        json.dumps(manifest, default=str, sort_keys=True),
+                    )
+                    yield buffer.drain()
+
+        # Central directory is written when the archive closes
+        yield buffer.drain()
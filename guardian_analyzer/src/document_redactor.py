@@ -0,0 +1,221 @@
+import os
+import re
+import logging
+import concurrent.futures
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz
+import numpy as np
+from datarakshak_shared.face_detector import (
+    create_face_detector,
+    detect_faces_normalized,
+    image_to_array,
+)
+
+from new_pdf_redactor import GuardianPDFRedactor
+
+logger = logging.getLogger("guardian-analyzer")
+
+# Inline images have no xref to decode, their page area is rendered instead
+INLINE_IMAGE_ZOOM = 2.0
+
+
+class DocumentRedactor:
+    def __init__(
+        self,
+        pdf_redactor: GuardianPDFRedactor,
+        face_detector=None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Text PII and face redaction of a PDF in a single page loop
+
+        Shares the analyzer, OCR and regex defaults of pdf_redactor. The face
+        detector is created lazily on first use unless one is given.
+        """
+        self.pdf_redactor = pdf_redactor
+        self._face_detector = face_detector
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+
+    @property
+    def face_detector(self):
+        if self._face_detector is None:
+            self._face_detector = create_face_detector()
+        return self._face_detector
+
+    def find_text_targets(
+        self,
+        page_text: str,
+        language: str,
+        entities: Optional[List[str]],
+        additional_keywords: List[str],
+        regex_patterns: List[str],
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """Analyze one page's text, returning (strings to redact, entity types)"""
+        detected = {}
+        if page_text.strip():
+            for result in self.pdf_redactor.analyzer.analyze(
+                text=page_text, language=language, entities=entities
+            ):
+                entity_text = page_text[result.start : result.end]
+                if len(entity_text.strip()) > 2:
+                    detected[entity_text] = result.entity_type
+
+        targets = set(detected) | set(additional_keywords)
+        for pattern in regex_patterns:
+            targets.update(m.group(0) for m in re.finditer(pattern, page_text))
+        # Longest first so partial matches do not split longer ones
+        return sorted((t for t in targets if t.strip()), key=len, reverse=True), detected
+
+    def _submit_page(self, executor, page, text_args, xref_faces, redact_faces):
+        """Extract a page's text and images and start both stages on the pool"""
+        text_future = executor.submit(self.find_text_targets, page.get_text(), *text_args)
+
+        placements = []
+        if redact_faces:
+            for info in page.get_image_info(xrefs=True):
+                bbox = fitz.Rect(info["bbox"])
+                if bbox.is_empty:
+                    continue
+                xref = info.get("xref", 0)
+                if xref == 0:
+                    pix = page.get_pixmap(
+                        matrix=fitz.Matrix(INLINE_IMAGE_ZOOM, INLINE_IMAGE_ZOOM),
+                        clip=bbox,
+                        alpha=False,
+                    )
+                    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                        pix.height, pix.width, pix.n
+                    )
+                    faces = executor.submit(
+                        detect_faces_normalized, image, self.face_detector
+                    )
+                    to_page = fitz.Matrix(bbox.width, 0, 0, bbox.height, bbox.x0, bbox.y0)
+                else:
+                    # Images reused across pages are decoded and scanned once
+                    if xref not in xref_faces:
+                        image = image_to_array(page.parent, xref)
+                        xref_faces[xref] = (
+                            None
+                            if image is None
+                            else executor.submit(
+                                detect_faces_normalized, image, self.face_detector
+                            )
+                        )
+                    faces = xref_faces[xref]
+                    # Maps the image's unit square onto the (unrotated) page
+                    to_page = fitz.Matrix(info["transform"])
+                if faces is not None:
+                    placements.append((faces, to_page))
+        return text_future, placements
+
+    def _apply_page(self, page, text_future, placements, fill) -> Tuple[int, int, Dict[str, str]]:
+        """Add every text and face redaction of a page and apply them at once"""
+        targets, detected = text_future.result()
+        text_count = 0
+        for target in targets:
+            for rect in page.search_for(target):
+                page.add_redact_annot(rect, fill=fill)
+                text_count += 1
+
+        face_count = 0
+        for faces, to_page in placements:
+            for top, right, bottom, left in faces.result():
+                rect = fitz.Rect(left, top, right, bottom) * to_page
+                rect.normalize()
+                page.add_redact_annot(rect, fill=fill)
+                face_count += 1
+
+        if text_count or face_count:
+            # Pixels under the boxes are blanked, images themselves are kept
+            page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS)
+        return text_count, face_count, detected
+
+    def redact_document(
+        self,
+        pdf_path: str,
+        output_path: Optional[str] = None,
+        language: str = "en",
+        entities: List[str] = None,
+        additional_keywords: List[str] = None,
+        custom_regex: List[str] = None,
+        ocr_language: str = "eng",
+        redact_faces: bool = True,
+        fill: Tuple[float, float, float] = (0, 0, 0),
+        return_bytes: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Redact text PII and faces of a PDF, opening and saving it once
+
+        Scanned pages are OCR'd first. Then each page's text is extracted
+        and its images decoded on this thread, while entity analysis and
+        face detection for the page run in parallel on a thread pool, a few
+        pages ahead of the page whose redactions are being applied. Unlike
+        redact_pdf, entities are redacted on the page they were found on.
+        With return_bytes the redacted PDF is returned as pdf_bytes and only
+        written if output_path is also given.
+        """
+        if output_path is None and not return_bytes:
+            raise ValueError("output_path is required unless return_bytes is set")
+
+        doc = fitz.open(pdf_path)
+        try:
+            ocr_pages = self.pdf_redactor.page_ocr.ocr_document(doc, ocr_language)
+
+            text_args = (
+                language,
+                entities,
+                additional_keywords or [],
+                self.pdf_redactor.default_regex_patterns + (custom_regex or []),
+            )
+            detected_entities = {}
+            text_redactions = faces_redacted = 0
+            xref_faces = {}
+            pending = deque()
+
+            def apply_next():
+                nonlocal text_redactions, faces_redacted
+                page_num, text_future, placements = pending.popleft()
+                text_count, face_count, detected = self._apply_page(
+                    doc[page_num], text_future, placements, fill
+                )
+                text_redactions += text_count
+                faces_redacted += face_count
+                detected_entities.update(detected)
+
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+                for page_num in range(len(doc)):
+                    # Bounded look-ahead keeps decoded images of only a few pages alive
+                    if len(pending) >= self.max_workers * 2:
+                        apply_next()
+                    text_future, placements = self._submit_page(
+                        executor, doc[page_num], text_args, xref_faces, redact_faces
+                    )
+                    pending.append((page_num, text_future, placements))
+                while pending:
+                    apply_next()
+
+            pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+            if output_path:
+                with open(output_path, "wb") as f:
+                    f.write(pdf_bytes)
+            logger.info(
+                f"Redacted {text_redactions} text matches and {faces_redacted} faces "
+                f"on {len(doc)} pages"
+            )
+            result = {
+                "status": "success",
+                "pages_processed": len(doc),
+                "detected_entities": detected_entities,
+                "text_redactions": text_redactions,
+                "faces_redacted": faces_redacted,
+                "ocr_pages": sorted(ocr_pages),
+                "output_path": output_path,
+            }
+            if return_bytes:
+                result["pdf_bytes"] = pdf_bytes
+            return result
+        finally:
+            doc.close()
+
@@ -0,0 +1,110 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from drm_metadata_store import DRMMetadataStore
+
+logger = logging.getLogger("guardian-analyzer")
+
+# Revoked and expired are final, clients may keep that answer for long
+BLOCKED_MAX_AGE = 3600
+
+
+class DRMAccessIndex:
+    def __init__(
+        self,
+        metadata_store: DRMMetadataStore,
+        sweep_interval: float = 5.0,
+        max_age: int = 10,
+    ):
+        """
+        Fast access decisions for /verify polls
+
+        Revoked and expired documents are kept in an in-memory map rebuilt
+        by a background sweeper, so polls for them never touch the store.
+        Other documents are looked up through the store's cache and their
+        pre-parsed expiry is compared to the clock. max_age caps how long
+        clients may cache an "active" answer, i.e. how late they notice a
+        revocation.
+        """
+        self.metadata_store = metadata_store
+        self.sweep_interval = sweep_interval
+        self.max_age = max_age
+
+        self._blocked: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def start(self):
+        """Run a first sweep, then keep sweeping on a daemon thread"""
+        self.sweep()
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, name="drm-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping DRM documents: {e}")
+
+    def sweep(self):
+        """Reload revoked and expired documents, including other processes' changes"""
+        blocked = self.metadata_store.blocked_documents()
+        with self._lock:
+            # Whole map is swapped, readers never see a partial update
+            self._blocked = blocked
+
+    def mark(self, doc_id: str, status: str):
+        """Record a revocation or expiry without waiting for the next sweep"""
+        self.mark_many([doc_id], status)
+
+    def mark_many(self, doc_ids: List[str], status: str):
+        with self._lock:
+            blocked = dict(self._blocked)
+            blocked.update(dict.fromkeys(doc_ids, status))
+            self._blocked = blocked
+
+    def check(self, doc_id: str) -> Dict[str, Any]:
+        """
+        Access decision for a document
+
+        Returns status ("active", "revoked", "expired" or "not_found"), the
+        ETag of that answer and how many seconds it may be cached.
+        """
+        status = self._blocked.get(doc_id)
+        if status is not None:
+            return self._decision(doc_id, status, BLOCKED_MAX_AGE)
+
+        metadata = self.metadata_store.get(doc_id)
+        if metadata is None:
+            return self._decision(doc_id, "not_found", 0)
+        if metadata["status"] != "active":
+            self.mark(doc_id, metadata["status"])
+            return self._decision(doc_id, metadata["status"], BLOCKED_MAX_AGE)
+
+        max_age = self.max_age
+        expiry_ts = metadata.get("expiry_ts")
+        if expiry_ts is not None:
+            remaining = expiry_ts - time.time()
+            if remaining <= 0:
+                self.mark(doc_id, "expired")
+                return self._decision(doc_id, "expired", BLOCKED_MAX_AGE)
+            # An "active" answer must not outlive the document
+            max_age = min(max_age, int(remaining))
+        return self._decision(doc_id, "active", max_age)
+
+    @staticmethod
+    def _decision(doc_id: str, status: str, max_age: int) -> Dict[str, Any]:
+        return {"status": status, "etag": f"{doc_id}-{status}", "max_age": max_age}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"blocked": len(self._blocked), **self.metadata_store.stats()}
@@ -0,0 +1,217 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("guardian-analyzer")
+
+# The repo ships an empty SQLite file for this under backend/database
+DEFAULT_DB_PATH = str(
+    Path(__file__).resolve().parents[2] / "backend" / "database" / "database.db"
+)
+
+METADATA_FIELDS = (
+    "doc_id",
+    "owner_id",
+    "creation_date",
+    "expiry_date",
+    "status",
+    "original_hash",
+    "expiry_ts",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drm_documents (
+    doc_id TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    creation_date TEXT NOT NULL,
+    expiry_date TEXT,
+    status TEXT NOT NULL DEFAULT 'active',
+    original_hash TEXT,
+    expiry_ts REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_drm_documents_owner_id ON drm_documents (owner_id);
+CREATE INDEX IF NOT EXISTS idx_drm_documents_expiry_ts ON drm_documents (expiry_ts);
+"""
+
+
+def expiry_timestamp(expiry_date: Optional[str]) -> Optional[float]:
+    """Epoch seconds of an ISO expiry date, naive dates are in local time"""
+    return datetime.fromisoformat(expiry_date).timestamp() if expiry_date else None
+
+
+class DRMMetadataStore:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        cache_size: int = 10000,
+        cache_ttl: float = 30.0,
+    ):
+        """
+        DRM document metadata in SQLite (WAL mode) with a read-through LRU cache
+
+        doc_id is the primary key of a WITHOUT ROWID table, so lookups go
+        straight to the clustered index; owner_id has its own index. Reads
+        are served from the cache, which is invalidated on every write in
+        this process. cache_ttl bounds how stale an entry can get when other
+        processes write to the same database.
+        """
+        self.db_path = db_path or os.environ.get("DRM_DB_PATH", DEFAULT_DB_PATH)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Safe with WAL, a crash can only lose the last transactions
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, metadata: Dict[str, Any]):
+        """Insert or replace a document's metadata"""
+        row = {field: metadata.get(field) for field in METADATA_FIELDS}
+        row["status"] = row["status"] or "active"
+        # Parsed once here so expiry checks only compare numbers
+        row["expiry_ts"] = expiry_timestamp(row["expiry_date"])
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO drm_documents ({', '.join(METADATA_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in METADATA_FIELDS)})",
+                [row[field] for field in METADATA_FIELDS],
+            )
+        self.invalidate(row["doc_id"])
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return a document's metadata, from the cache when possible"""
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(doc_id)
+            if entry is not None and now - entry[1] < self.cache_ttl:
+                self._cache.move_to_end(doc_id)
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+
+        row = (
+            self._connection()
+            .execute("SELECT * FROM drm_documents WHERE doc_id = ?", (doc_id,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+
+        metadata = dict(row)
+        with self._cache_lock:
+            self._cache[doc_id] = (metadata, now)
+            self._cache.move_to_end(doc_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return dict(metadata)
+
+    def set_status(self, doc_id: str, owner_id: str, status: str) -> bool:
+        """Change the status of a document owned by owner_id, returns False if none matched"""
+        with self._connection() as conn:
+            updated = conn.execute(
+                "UPDATE drm_documents SET status = ? WHERE doc_id = ? AND owner_id = ?",
+                (status, doc_id, owner_id),
+            ).rowcount
+        self.invalidate(doc_id)
+        return updated > 0
+
+    def revoke(self, doc_id: str, owner_id: str) -> bool:
+        """Revoke a document, dropping it from the cache"""
+        return self.set_status(doc_id, owner_id, "revoked")
+
+    def revoke_many(
+        self, owner_id: str, doc_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Revoke the given documents of owner_id, or all of them, in one transaction
+
+        Returns the ids that were newly revoked; ids of other owners and
+        unknown ids are left alone.
+        """
+        conn = self._connection()
+        with conn:
+            # Taken up front so no document is activated between select and update
+            conn.execute("BEGIN IMMEDIATE")
+            if doc_ids is None:
+                rows = conn.execute(
+                    "SELECT doc_id FROM drm_documents "
+                    "WHERE owner_id = ? AND status != 'revoked'",
+                    (owner_id,),
+                ).fetchall()
+            else:
+                rows = []
+                # Stays under SQLite's limit on bound parameters
+                for i in range(0, len(doc_ids), 500):
+                    batch = doc_ids[i : i + 500]
+                    rows += conn.execute(
+                        "SELECT doc_id FROM drm_documents WHERE owner_id = ? "
+                        f"AND status != 'revoked' AND doc_id IN ({', '.join('?' * len(batch))})",
+                        [owner_id, *batch],
+                    ).fetchall()
+            revoked = [row["doc_id"] for row in rows]
+            conn.executemany(
+                "UPDATE drm_documents SET status = 'revoked' WHERE doc_id = ?",
+                [(doc_id,) for doc_id in revoked],
+            )
+
+        with self._cache_lock:
+            for doc_id in revoked:
+                self._cache.pop(doc_id, None)
+        return revoked
+
+    def list_by_owner(self, owner_id: str) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT * FROM drm_documents WHERE owner_id = ? ORDER BY creation_date",
+            (owner_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def blocked_documents(self, now: Optional[float] = None) -> Dict[str, str]:
+        """Revoked and expired documents, as {doc_id: status}"""
+        now = time.time() if now is None else now
+        rows = self._connection().execute(
+            "SELECT doc_id, status FROM drm_documents WHERE status != 'active' "
+            "UNION SELECT doc_id, 'expired' FROM drm_documents "
+            "WHERE status = 'active' AND expiry_ts <= ?",
+            (now,),
+        )
+        return {doc_id: status for doc_id, status in rows}
+
+    def invalidate(self, doc_id: str):
+        with self._cache_lock:
+            self._cache.pop(doc_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "max_entries": self.cache_size,
+            }
@@ -1,30 +1,112 @@
 import fitz
+import hmac
 import json
-import os
 import uuid
+import hashlib
 import requests
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from cryptography.fernet import Fernet
 import logging
 
+from drm_access import DRMAccessIndex
+from drm_metadata_store import DRMMetadataStore
+from upload_ingest import sha256_file
+
 logger = logging.getLogger("guardian-analyzer")
 
+# (connect, read) seconds for calls to the DRM server
+REQUEST_TIMEOUT = (3.05, 10)
+
+# PDF encryption only uses the first 40 characters of a password
+MAX_PDF_PASSWORD_LENGTH = 40
+
+
+def create_session(pool_size: int = 10, retries: int = 3) -> requests.Session:
+    """
+    Keep-alive session retrying connection errors and 502/503/504 with backoff
+
+    Only urllib3's default idempotent methods are retried. A POST that is
+    safe to repeat has to be retried explicitly where it is sent.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def add_document_javascript(doc: fitz.Document, name: str, script: str) -> int:
+    """
+    Add a document-level script, which PDF viewers run when the file opens
+
+    The script goes into the catalog's Names/JavaScript name tree, keeping
+    the document's own scripts listed there. Returns the action's xref.
+    """
+    script_xref = doc.get_new_xref()
+    doc.update_object(script_xref, "<<>>")
+    doc.update_stream(script_xref, script.encode())
+    action_xref = doc.get_new_xref()
+    doc.update_object(
+        action_xref, f"<< /Type /Action /S /JavaScript /JS {script_xref} 0 R >>"
+    )
+
+    catalog = doc.pdf_catalog()
+    kind, names = doc.xref_get_key(catalog, "Names/JavaScript/Names")
+    existing = names[1:-1] if kind == "array" else ""
+    doc.xref_set_key(
+        catalog,
+        "Names/JavaScript",
+        f"<< /Names [{fitz.get_pdf_str(name)} {action_xref} 0 R {existing}] >>",
+    )
+    return action_xref
+
 class DRMPDFManager:
-    def __init__(self, api_url: str):
+    def __init__(
+        self,
+        api_url: str,
+        metadata_store: Optional[DRMMetadataStore] = None,
+        access_index: Optional[DRMAccessIndex] = None,
+        session: Optional[requests.Session] = None,
+    ):
         """Initialize DRM PDF Manager"""
         self.api_url = api_url
+        self.session = session or create_session()
+        self.metadata_store = metadata_store or DRMMetadataStore()
+        self.access_index = access_index or DRMAccessIndex(self.metadata_store)
         self.key = Fernet.generate_key()
         self.cipher_suite = Fernet(self.key)
         
     def create_drm_pdf(
         self,
         input_path: str,
-        output_path: str,
+        output_path: Optional[str],
         owner_id: str,
         expiry_date: Optional[datetime] = None,
+        original_hash: Optional[str] = None,
+        return_bytes: bool = False,
     ) -> Dict[str, Any]:
-        """Create a stealthy DRM-protected PDF that looks like a normal PDF"""
+        """
+        Create a stealthy DRM-protected PDF that looks like a normal PDF
+
+        original_hash is the input's SHA-256 when already known from ingest,
+        otherwise the file is hashed here. The DRM id is kept in the store
+        and in the standard keywords entry, the verification script is
+        installed as document-level JavaScript. With return_bytes the PDF is returned as
+        pdf_bytes and only written if output_path is also given.
+        """
+        if output_path is None and not return_bytes:
+            raise ValueError("output_path is required unless return_bytes is set")
+
         try:
             doc_id = str(uuid.uuid4())
             
@@ -64,24 +146,29 @@ class DRMPDFManager:
             # Open and modify the PDF
             doc = fitz.open(input_path)
             
-            # Add hidden metadata for tracking
+            # Only the standard Info keys are accepted, the id goes into keywords
+            keywords = (doc.metadata or {}).get("keywords") or ""
             doc.set_metadata({
+                **(doc.metadata or {}),
                 "format": "PDF-1.7",  # Standard PDF format
                 "encryption": None,    # Hide encryption info
-                "javascript": verify_script,
-                "drm_id": doc_id      # Hidden DRM ID
+                "keywords": f"{keywords} drm:{doc_id}".strip(),
             })
+            add_document_javascript(doc, "drm_verify", verify_script)
             
             # Save with minimal visible security
-            doc.save(
-                output_path,
+            pdf_bytes = doc.tobytes(
                 encryption=fitz.PDF_ENCRYPT_AES_256,
-                owner_pw=self.key.decode(),
+                owner_pw=self._owner_password(doc_id),
                 user_pw="",  # No visible password protection
                 permissions=fitz.PDF_PERM_ACCESSIBILITY | fitz.PDF_PERM_PRINT | fitz.PDF_PERM_COPY,
                 garbage=4,   # Maximum cleanup
                 deflate=True # Compress to hide modifications
             )
+            doc.close()
+            if output_path:
+                with open(output_path, "wb") as f:
+                    f.write(pdf_bytes)
             
             # Store DRM metadata separately
             drm_metadata = {
@@ -90,74 +177,100 @@ class DRMPDFManager:
                 'creation_date': datetime.now().isoformat(),
                 'expiry_date': expiry_date.isoformat() if expiry_date else None,
                 'status': 'active',
-                'original_hash': self._calculate_hash(input_path)
+                'original_hash': original_hash or self._calculate_hash(input_path)
             }
             
             self._store_metadata(doc_id, drm_metadata)
             
-            return {
+            result = {
                 'status': 'success',
                 'doc_id': doc_id,
                 'output_path': output_path
             }
+            if return_bytes:
+                result['pdf_bytes'] = pdf_bytes
+            return result
             
         except Exception as e:
             logger.error(f"Error creating stealth DRM PDF: {str(e)}")
             raise
 
+    def _owner_password(self, doc_id: str) -> str:
+        """Per-document owner password derived from the DRM key, short enough for PDF"""
+        digest = hmac.new(self.key, doc_id.encode(), hashlib.sha256).hexdigest()
+        return digest[:MAX_PDF_PASSWORD_LENGTH]
+
     def revoke_access(self, doc_id: str, owner_id: str) -> Dict[str, Any]:
         """Revoke access to a DRM-protected PDF"""
         try:
-            # Update DRM status on server
-            response = requests.post(f"{self.api_url}/revoke", 
-                json={'doc_id': doc_id, 'owner_id': owner_id})
-            
-            if response.status_code == 200:
-                return {'status': 'success', 'message': 'Access revoked successfully'}
-            else:
-                raise Exception(f"Failed to revoke access: {response.text}")
-                
+            # The store drops the cached metadata, so /verify sees the revocation at once
+            if not self.metadata_store.revoke(doc_id, owner_id):
+                raise Exception("Document not found for this owner")
+            self.access_index.mark(doc_id, 'revoked')
+            return {'status': 'success', 'message': 'Access revoked successfully'}
+
         except Exception as e:
             logger.error(f"Error revoking access: {str(e)}")
             raise
 
+    def revoke_access_bulk(
+        self, owner_id: str, doc_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Revoke the listed documents of owner_id, or all of them, in one transaction"""
+        try:
+            revoked = self.metadata_store.revoke_many(owner_id, doc_ids)
+            self.access_index.mark_many(revoked, 'revoked')
+            return {'status': 'success', 'revoked': len(revoked), 'doc_ids': revoked}
+
+        except Exception as e:
+            logger.error(f"Error revoking access in bulk: {str(e)}")
+            raise
+
     def open_drm_pdf(self, drm_path: str) -> fitz.Document:
-        """Open and verify a DRM-protected PDF"""
+        """Open and verify a DRM-protected PDF, the plaintext never touches disk"""
         try:
-            # Read DRM container
-            with open(drm_path, 'r') as f:
+            with open(drm_path, 'rb') as f:
+                # A JSON container, not e.g. a plain PDF, before parsing it all
+                if not f.read(64).lstrip().startswith(b'{'):
+                    raise ValueError("Not a DRM container")
+                f.seek(0)
                 drm_container = json.load(f)
-            
+
             metadata = drm_container['metadata']
-            
-            # Verify access with server
-            response = requests.get(f"{self.api_url}/verify",
-                params={'doc_id': metadata['doc_id']})
-            
-            if response.status_code != 200:
-                raise Exception("Access denied or revoked")
-            
-            # Decrypt content
+            self._verify_remote(metadata['doc_id'])
             cipher_suite = Fernet(metadata['encryption_key'].encode())
-            decrypted_data = cipher_suite.decrypt(drm_container['content'].encode())
-            
-            # Create temporary file for PyMuPDF
-            temp_path = f"/tmp/{metadata['doc_id']}.pdf"
-            with open(temp_path, 'wb') as f:
-                f.write(decrypted_data)
-            
-            # Open with PyMuPDF
-            doc = fitz.open(temp_path)
-            os.remove(temp_path)  # Clean up
-            
-            return doc
-            
+            # The token is dropped as soon as it is decoded, only the plaintext stays
+            token = drm_container.pop('content').encode()
+            del drm_container
+            decrypted_data = cipher_suite.decrypt(token)
+            del token
+
+            return fitz.open(stream=decrypted_data, filetype="pdf")
+
         except Exception as e:
             logger.error(f"Error opening DRM PDF: {str(e)}")
-            raise 
+            raise
+
+    def _verify_remote(self, doc_id: str):
+        """Ask the DRM server whether doc_id may be opened"""
+        response = self.session.get(f"{self.api_url}/verify",
+            params={'doc_id': doc_id}, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            raise Exception("Access denied or revoked")
+
+    def verify_access(self, doc_id: str) -> Dict[str, Any]:
+        """Access decision for a /verify poll, see DRMAccessIndex.check"""
+        return self.access_index.check(doc_id)
+
+    def _store_metadata(self, doc_id: str, metadata: Dict[str, Any]):
+        """Persist DRM metadata of a document"""
+        self.metadata_store.put({**metadata, 'doc_id': doc_id})
+
+    def _get_metadata(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """DRM metadata of a document, or None if it is unknown"""
+        return self.metadata_store.get(doc_id)
 
     def _calculate_hash(self, file_path: str) -> str:
         """Calculate file hash for integrity checking"""
-        import hashlib
-        with open(file_path, "rb") as f:
-            return hashlib.sha256(f.read()).hexdigest()
\ No newline at end of file
+        return sha256_file(file_path)
\ No newline at end of file
@@ -1,20 +1,101 @@
+import os
 import cv2
+import concurrent.futures
 import numpy as np
-from PIL import Image, ImageDraw
 import pytesseract
-from typing import List, Dict, Any, Tuple
+from PIL import Image, TiffImagePlugin
+from typing import BinaryIO, List, Dict, Any, Tuple, Optional, Union
 from guardian_analyzer import AnalyzerEngine
+from ocr_cache import OCRCache
 import logging
 
+# Supported ways of hiding a detected region
+REDACTION_MODES = ("fill", "blur", "pixelate")
+
+# Map file extensions to the extension OpenCV expects for encoding
+IMAGE_FORMATS = {
+    ".png": ".png",
+    ".jpg": ".jpg",
+    ".jpeg": ".jpg",
+    ".tif": ".tiff",
+    ".tiff": ".tiff",
+    ".bmp": ".bmp",
+    ".webp": ".webp",
+}
+
+# Gray level from which a redacted frame is written back as white in bilevel
+# TIFFs; a hard threshold keeps filled boxes solid where dithering would not
+BILEVEL_THRESHOLD = 128
+
+MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".tiff": "image/tiff",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+}
+
+
+def fill_regions(
+    image: np.ndarray,
+    regions: List[Tuple[int, int, int, int]],
+    color: Tuple[int, int, int],
+) -> np.ndarray:
+    """Fill (x, y, w, h) regions of a BGR image with a solid color, in place"""
+    color = np.asarray(color[::-1], dtype=image.dtype)  # RGB -> BGR
+    for x, y, w, h in regions:
+        image[y : y + h, x : x + w] = color
+    return image
+
+
+def blur_regions(
+    image: np.ndarray, regions: List[Tuple[int, int, int, int]]
+) -> np.ndarray:
+    """Gaussian blur (x, y, w, h) regions of an image, in place"""
+    for x, y, w, h in regions:
+        roi = image[y : y + h, x : x + w]
+        if roi.size == 0:
+            continue
+        # Kernel scales with the region so large text is not left readable
+        k = max(3, (min(w, h) // 2) | 1)
+        roi[:] = cv2.GaussianBlur(roi, (k, k), 0)
+    return image
+
+
+def pixelate_regions(
+    image: np.ndarray,
+    regions: List[Tuple[int, int, int, int]],
+    block_size: int = 8,
+) -> np.ndarray:
+    """Pixelate (x, y, w, h) regions of an image, in place"""
+    for x, y, w, h in regions:
+        roi = image[y : y + h, x : x + w]
+        if roi.size == 0:
+            continue
+        rh, rw = roi.shape[:2]
+        small = cv2.resize(
+            roi,
+            (max(1, rw // block_size), max(1, rh // block_size)),
+            interpolation=cv2.INTER_LINEAR,
+        )
+        roi[:] = cv2.resize(small, (rw, rh), interpolation=cv2.INTER_NEAREST)
+    return image
+
 
 class PresidioImageRedactor:
-    def __init__(self, analyzer_engine: AnalyzerEngine = None):
+    def __init__(
+        self, analyzer_engine: AnalyzerEngine = None, ocr_cache: OCRCache = None
+    ):
         """
         Image Redactor that uses Guardian analysis results
         """
         self.analyzer = analyzer_engine or AnalyzerEngine()
+        self.ocr_cache = ocr_cache
         self.logger = logging.getLogger("guardian-analyzer")
 
+        # Describes preprocess_image; part of the OCR cache key
+        self.preprocess_settings = {"grayscale": True, "threshold": "otsu"}
+
         # Use the same regex patterns as PDF redactor for consistency
         self.default_regex_patterns = [
             r"\b[A-Z]{2}\d{6}\b",  # Default ID-like pattern
@@ -50,16 +131,146 @@ class PresidioImageRedactor:
         thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
         return thresh
 
+    def ocr_image(self, image: np.ndarray, ocr_language: str = "eng") -> Dict[str, Any]:
+        """
+        Run OCR on a BGR image, returning {"text": ..., "boxes": ...}
+
+        Results are looked up in the OCR cache first, so repeated images skip
+        preprocessing and Tesseract entirely.
+        """
+
+        def run_ocr():
+            # Preprocess for better OCR
+            processed_image = self.preprocess_image(image)
+            return {
+                "text": pytesseract.image_to_string(
+                    processed_image, lang=ocr_language
+                ),
+                "boxes": pytesseract.image_to_data(
+                    processed_image,
+                    lang=ocr_language,
+                    output_type=pytesseract.Output.DICT,
+                ),
+            }
+
+        if self.ocr_cache is None:
+            return run_ocr()
+        key = self.ocr_cache.make_key(image, self.preprocess_settings, ocr_language)
+        return self.ocr_cache.get_or_compute(key, run_ocr)
+
+    def find_redaction_boxes(
+        self, boxes: Dict[str, List], detected_entities: List[Dict[str, Any]]
+    ) -> List[Tuple[int, int, int, int]]:
+        """Match detected entities against OCR word boxes, returning (x, y, w, h)"""
+        regions = []
+        words = boxes["text"]
+        for entity in detected_entities:
+            entity_text = entity["text"]
+            # Find word positions in OCR results
+            for i, word in enumerate(words):
+                if entity_text in word:
+                    regions.append(
+                        (
+                            boxes["left"][i],
+                            boxes["top"][i],
+                            boxes["width"][i],
+                            boxes["height"][i],
+                        )
+                    )
+        return regions
+
+    def apply_redactions(
+        self,
+        image: np.ndarray,
+        regions: List[Tuple[int, int, int, int]],
+        redaction_mode: str = "fill",
+        color_fill: Tuple[int, int, int] = (0, 0, 0),
+    ) -> np.ndarray:
+        """Redact regions directly on the BGR array without copying the frame"""
+        if redaction_mode == "fill":
+            return fill_regions(image, regions, color_fill)
+        if redaction_mode == "blur":
+            return blur_regions(image, regions)
+        if redaction_mode == "pixelate":
+            return pixelate_regions(image, regions)
+        raise ValueError(f"Unsupported redaction mode: {redaction_mode}")
+
+    def encode_image(
+        self,
+        image: np.ndarray,
+        image_format: str = ".png",
+        jpeg_quality: int = 95,
+        png_compression: int = 3,
+    ) -> bytes:
+        """Encode a BGR array straight to the given format with OpenCV"""
+        image_format = IMAGE_FORMATS.get(image_format.lower(), ".png")
+        params = []
+        if image_format == ".jpg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        elif image_format == ".png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+        elif image_format == ".webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, int(jpeg_quality)]
+
+        ok, buffer = cv2.imencode(image_format, image, params)
+        if not ok:
+            raise ValueError(f"Could not encode image as {image_format}")
+        return buffer.tobytes()
+
+    def redact_frame(
+        self,
+        image: np.ndarray,
+        language: str = "en",
+        ocr_language: str = "eng",
+        entities: List[str] = None,
+        color_fill: Tuple[int, int, int] = (0, 0, 0),
+        redaction_mode: str = "fill",
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[int, int, int, int]]]:
+        """OCR, analyze and redact a single BGR frame in place"""
+        # Extract text and word boxes using OCR
+        ocr_result = self.ocr_image(image, ocr_language)
+        text = ocr_result["text"]
+        boxes = ocr_result["boxes"]
+
+        # Analyze text with Presidio
+        analyzer_results = self.analyzer.analyze(
+            text=text, language=language, entities=entities
+        )
+
+        # Counts only, the OCR'd text and entities are PII themselves
+        self.logger.debug(
+            f"OCR found {len(text)} characters, {len(analyzer_results)} entities"
+        )
+
+        # Extract entities with positions
+        detected_entities = self.extract_entities_from_analysis(
+            analyzer_results, text
+        )
+
+        # Redact detected entities in place on the decoded array
+        regions = self.find_redaction_boxes(boxes, detected_entities)
+        self.apply_redactions(image, regions, redaction_mode, color_fill)
+        return detected_entities, regions
+
     def redact_image(
         self,
         image_path: str,
-        output_path: str,
+        output_path: Optional[str] = None,
         language: str = "en",
+        ocr_language: str = "eng",
         entities: List[str] = None,
         color_fill: Tuple[int, int, int] = (0, 0, 0),
+        redaction_mode: str = "fill",
+        jpeg_quality: int = 95,
+        png_compression: int = 3,
+        return_bytes: bool = False,
     ) -> Dict[str, Any]:
         """
         Analyze and redact image using Guardian analysis
+
+        The output keeps the format of the source image. When return_bytes is
+        set the encoded image is returned under "image_bytes" and nothing is
+        written unless output_path is also given.
         """
         try:
             # Read and preprocess image
@@ -67,64 +278,212 @@ class PresidioImageRedactor:
             if image is None:
                 raise ValueError("Could not read image")
 
-            # Preprocess for better OCR
-            processed_image = self.preprocess_image(image)
+            return self.redact_image_array(
+                image,
+                image_format=os.path.splitext(image_path)[1],
+                output_path=output_path,
+                language=language,
+                ocr_language=ocr_language,
+                entities=entities,
+                color_fill=color_fill,
+                redaction_mode=redaction_mode,
+                jpeg_quality=jpeg_quality,
+                png_compression=png_compression,
+                return_bytes=return_bytes,
+            )
 
-            # Extract text using OCR
-            text = pytesseract.image_to_string(processed_image)
+        except Exception as e:
+            self.logger.error(f"Error during image redaction: {str(e)}")
+            raise
 
-            print(f"Extracted text: {text}")
+    def redact_image_bytes(
+        self, data: bytes, image_format: str = ".png", **kwargs
+    ) -> Dict[str, Any]:
+        """Decode an in-memory image and redact it, see redact_image_array"""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        kwargs.setdefault("return_bytes", True)
+        return self.redact_image_array(image, image_format=image_format, **kwargs)
 
-            # Get word boxes from OCR
-            boxes = pytesseract.image_to_data(
-                processed_image, output_type=pytesseract.Output.DICT
-            )
+    def redact_image_array(
+        self,
+        image: np.ndarray,
+        image_format: str = ".png",
+        output_path: Optional[str] = None,
+        language: str = "en",
+        ocr_language: str = "eng",
+        entities: List[str] = None,
+        color_fill: Tuple[int, int, int] = (0, 0, 0),
+        redaction_mode: str = "fill",
+        jpeg_quality: int = 95,
+        png_compression: int = 3,
+        return_bytes: bool = False,
+    ) -> Dict[str, Any]:
+        """Analyze and redact an already decoded BGR image, modifying it in place"""
+        if redaction_mode not in REDACTION_MODES:
+            raise ValueError(f"Unsupported redaction mode: {redaction_mode}")
+        if output_path is None and not return_bytes:
+            raise ValueError("output_path is required unless return_bytes is set")
 
-            # Analyze text with Presidio
-            analyzer_results = self.analyzer.analyze(
-                text=text, language=language, entities=entities
-            )
+        detected_entities, regions = self.redact_frame(
+            image,
+            language=language,
+            ocr_language=ocr_language,
+            entities=entities,
+            color_fill=color_fill,
+            redaction_mode=redaction_mode,
+        )
 
-            # self.logger.info(f"Detected entities: {analyzer_results}")
-            for result in analyzer_results:
-                print(
-                    f"Detected entity: {result.entity_type} :- {text[result.start:result.end]} Score: {result.score}"
-                )
+        # Encode in the source format
+        image_format = IMAGE_FORMATS.get(image_format.lower(), ".png")
+        image_bytes = self.encode_image(
+            image, image_format, jpeg_quality, png_compression
+        )
 
-            # Extract entities with positions
-            detected_entities = self.extract_entities_from_analysis(
-                analyzer_results, text
-            )
+        # Save redacted image
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(image_bytes)
+
+        result = {
+            "status": "success",
+            "detected_entities": [e["text"] for e in detected_entities],
+            "entity_types": list(set(e["type"] for e in detected_entities)),
+            "output_path": output_path,
+            "mimetype": MIME_TYPES[image_format],
+            "redacted_regions": len(regions),
+        }
+        if return_bytes:
+            result["image_bytes"] = image_bytes
+        return result
 
-            # Convert to PIL for drawing
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            draw = ImageDraw.Draw(pil_image)
-
-            # Redact detected entities
-            for entity in detected_entities:
-                entity_text = entity["text"]
-                # Find word positions in OCR results
-                words = boxes["text"]
-                for i, word in enumerate(words):
-                    if entity_text in word:
-                        # print(f"Redacting entity: {entity_text}", sep="\t")
-                        x = boxes["left"][i]
-                        y = boxes["top"][i]
-                        w = boxes["width"][i]
-                        h = boxes["height"][i]
-                        # Draw redaction rectangle
-                        draw.rectangle([(x, y), (x + w, y + h)], fill=color_fill)
-
-            # Save redacted image
-            pil_image.save(output_path)
+    def _decode_frame(self, container: Image.Image, index: int) -> np.ndarray:
+        """Decode a single frame of a multi-frame image to a BGR array"""
+        container.seek(index)
+        rgb = np.asarray(container.convert("RGB"))
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
 
+    def redact_multiframe_image(
+        self,
+        image_path: str,
+        output_path: Union[str, BinaryIO],
+        language: str = "en",
+        ocr_language: str = "eng",
+        entities: List[str] = None,
+        color_fill: Tuple[int, int, int] = (0, 0, 0),
+        redaction_mode: str = "fill",
+        max_workers: int = None,
+    ) -> Dict[str, Any]:
+        """
+        Redact every frame of a multi-page image (e.g. a fax TIFF) into a TIFF
+
+        Frames are decoded one at a time and appended to the output as soon
+        as they and all earlier frames are done, so at most max_workers
+        frames are held in memory. Frames keep their source mode and
+        compression where the redacted pixels allow it. output_path may also
+        be a seekable binary file object, which is left open.
+        """
+        try:
+            if redaction_mode not in REDACTION_MODES:
+                raise ValueError(f"Unsupported redaction mode: {redaction_mode}")
+            max_workers = max_workers or min(4, os.cpu_count() or 1)
+
+            frame_results = []
+            with Image.open(image_path) as container, \
+                    TiffImagePlugin.AppendingTiffWriter(output_path, True) as writer, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+                n_frames = getattr(container, "n_frames", 1)
+                pending = {}
+                next_to_write = 0
+
+                def write_ready():
+                    nonlocal next_to_write
+                    while next_to_write in pending and pending[next_to_write].done():
+                        frame, mode, compression = pending.pop(next_to_write).result()
+                        out = Image.fromarray(
+                            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        )
+                        if mode == "1":
+                            out = out.convert("L").point(
+                                lambda v: 255 if v >= BILEVEL_THRESHOLD else 0,
+                                mode="1",
+                            )
+                        elif mode == "L":
+                            out = out.convert(mode)
+                        # CCITT fax compression only applies to bilevel frames
+                        save_args = {}
+                        if compression and (
+                            out.mode == "1"
+                            or compression not in ("group3", "group4")
+                        ):
+                            save_args["compression"] = compression
+                        out.save(writer, format="TIFF", **save_args)
+                        writer.newFrame()
+                        next_to_write += 1
+
+                def process(index, frame, mode, compression):
+                    detected_entities, regions = self.redact_frame(
+                        frame,
+                        language=language,
+                        ocr_language=ocr_language,
+                        entities=entities,
+                        color_fill=color_fill,
+                        redaction_mode=redaction_mode,
+                    )
+                    frame_results.append(
+                        {
+                            "frame": index,
+                            "detected_entities": [
+                                e["text"] for e in detected_entities
+                            ],
+                            "entity_types": list(
+                                set(e["type"] for e in detected_entities)
+                            ),
+                            "redacted_regions": len(regions),
+                        }
+                    )
+                    return frame, mode, compression
+
+                for index in range(n_frames):
+                    # Bound the number of decoded frames in flight
+                    while len(pending) >= max_workers:
+                        concurrent.futures.wait(
+                            [pending[next_to_write]],
+                            return_when=concurrent.futures.FIRST_COMPLETED,
+                        )
+                        write_ready()
+
+                    frame = self._decode_frame(container, index)
+                    pending[index] = executor.submit(
+                        process,
+                        index,
+                        frame,
+                        container.mode,
+                        container.info.get("compression"),
+                    )
+                    del frame
+                    write_ready()
+
+                while pending:
+                    concurrent.futures.wait([pending[next_to_write]])
+                    write_ready()
+
+            frame_results.sort(key=lambda r: r["frame"])
             return {
                 "status": "success",
-                "detected_entities": [e["text"] for e in detected_entities],
-                "entity_types": list(set(e["type"] for e in detected_entities)),
+                "frames": n_frames,
+                "frame_results": frame_results,
+                "detected_entities": sorted(
+                    set(e for r in frame_results for e in r["detected_entities"])
+                ),
+                "entity_types": sorted(
+                    set(t for r in frame_results for t in r["entity_types"])
+                ),
                 "output_path": output_path,
+                "mimetype": MIME_TYPES[".tiff"],
             }
 
         except Exception as e:
-            self.logger.error(f"Error during image redaction: {str(e)}")
+            self.logger.error(f"Error during multi-frame image redaction: {str(e)}")
             raise
@@ -2,4 +2,7 @@
 
 poetry install -E server ${POETRY_EXTRAS} --no-interaction
 
+# OCR text layer code shared with face_detection
+poetry run pip install -e ../../shared
+
 poetry run python install_nlp_models.py --conf_file "$NLP_CONF_FILE"
\ No newline at end of file
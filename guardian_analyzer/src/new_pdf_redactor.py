@@ -9,16 +9,24 @@ from typing import List, Dict, Any, Optional
 from guardian_analyzer import AnalyzerEngine
 from datetime import datetime
 
+from pdf_ocr import PDFPageOCR
+
 # Change logger name
 logger = logging.getLogger("guardian-analyzer")
 
 
 class GuardianPDFRedactor:
-    def __init__(self, analyzer_engine: AnalyzerEngine = None):
+    def __init__(
+        self, analyzer_engine: AnalyzerEngine = None, page_ocr: PDFPageOCR = None
+    ):
         """
         PDF Redactor that uses Guardian analysis results with comprehensive redaction
+
+        Scanned pages are OCR'd first by page_ocr, so their text is analysed
+        and redacted like any other page.
         """
         self.analyzer = analyzer_engine or AnalyzerEngine()
+        self.page_ocr = page_ocr or PDFPageOCR()
 
         # Precompile common regex patterns for efficiency
         self.default_regex_patterns = [
@@ -96,6 +104,7 @@ class GuardianPDFRedactor:
         custom_regex: List[str] = None,
         entities: List[str] = None,
         redaction_style: str = "blackbox",
+        ocr_language: str = "eng",
     ) -> Dict[str, Any]:
         """
         Analyze and redact PDF using Guardian analysis with comprehensive redaction
@@ -104,10 +113,15 @@ class GuardianPDFRedactor:
             doc = fitz.open(pdf_path)
             detected_entities = {}
 
+            # Scanned pages get an invisible OCR text layer, text pages are untouched
+            ocr_pages = self.page_ocr.ocr_document(doc, ocr_language)
+
+            # Page text is extracted once and shared by both passes
+            page_texts = [page.get_text() for page in doc]
+
             # First pass: Entity Detection
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text()
+                page_text = page_texts[page_num]
 
                 # Analyze text with Guardian
                 analyzer_results = self.analyzer.analyze(
@@ -135,7 +149,7 @@ class GuardianPDFRedactor:
             # Perform Redaction
             for page_num in range(len(doc)):
                 page = doc[page_num]
-                page_text = page.get_text()
+                page_text = page_texts[page_num]
 
                 # Get all targets including regex matches
                 redact_targets = redaction_config["keywords"] + [
@@ -203,6 +217,7 @@ class GuardianPDFRedactor:
                 "detected_entities": detected_entities,
                 "output_path": output_path,
                 "redaction_style": redaction_style,
+                "ocr_pages": sorted(ocr_pages),
             }
 
         except Exception as e:
@@ -215,12 +230,14 @@ class GuardianPDFRedactor:
         output_path: str,
         strings_to_redact: List[str],
         redaction_style: str = "blackbox",
+        ocr_language: str = "eng",
     ) -> Dict[str, Any]:
         """
         Redact only specific strings from PDF without any analysis
         """
         try:
             doc = fitz.open(pdf_path)
+            ocr_pages = self.page_ocr.ocr_document(doc, ocr_language)
             
             # Sort strings by length (longest first) to avoid partial matches
             redact_targets = sorted(strings_to_redact, key=len, reverse=True)
@@ -276,6 +293,7 @@ class GuardianPDFRedactor:
                 "redacted_strings": strings_to_redact,
                 "output_path": output_path,
                 "redaction_style": redaction_style,
+                "ocr_pages": sorted(ocr_pages),
             }
 
         except Exception as e:
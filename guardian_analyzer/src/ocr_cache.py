@@ -0,0 +1,197 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("guardian-analyzer")
+
+
+class OCRCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        LRU cache of OCR results keyed by image content
+
+        Entries are JSON-serialisable dicts (OCR text and word boxes). The
+        in-memory tier is capped at max_bytes of serialised results; when
+        cache_dir is set, results are also written there and the directory
+        is pruned back under max_disk_bytes, oldest first.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    @staticmethod
+    def make_key(image: np.ndarray, settings: Dict[str, Any], language: str) -> str:
+        """Hash the decoded pixels together with the OCR settings and language"""
+        h = hashlib.sha256()
+        h.update(f"{image.shape}|{image.dtype}|".encode())
+        h.update(np.ascontiguousarray(image).data)
+        h.update(json.dumps(settings, sort_keys=True).encode())
+        h.update(language.encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result, promoting disk hits into memory"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, value, len(json.dumps(value)))
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a result in memory and, if enabled, on disk"""
+        data = json.dumps(value)
+        self._put_memory(key, value, len(data))
+        if self.cache_dir:
+            self._write_disk(key, data)
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Return the cached result for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate and size metrics"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.cache_dir),
+            }
+
+    def clear(self):
+        """Drop all in-memory entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._current_bytes = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def _put_memory(self, key: str, value: Dict[str, Any], size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._current_bytes -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._current_bytes -= self._sizes.pop(old_key)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            os.utime(path)  # Keep recently used entries at the back of the pruning order
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable OCR cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, data: str):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            # An entry written again replaces its old file, which no longer counts
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += len(data) - replaced
+                over_cap = self._disk_bytes > self.max_disk_bytes
+            if over_cap:
+                self._prune_disk()
+        except Exception as e:
+            logger.warning(f"Could not persist OCR cache entry: {e}")
+
+    def _scan_disk(self):
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _prune_disk(self):
+        # Prune down to 90% of the cap so we do not rescan on every write
+        files = self._scan_disk()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
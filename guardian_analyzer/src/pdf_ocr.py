@@ -0,0 +1,89 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+import numpy as np
+from datarakshak_shared import pdf_text_layer
+from datarakshak_shared.pdf_text_layer import (
+    DEFAULT_OCR_DPI,
+    MIN_WORD_CONFIDENCE,
+    ocr_words,
+    pages_needing_ocr,
+    rasterize_page,
+)
+
+from ocr_cache import OCRCache
+
+logger = logging.getLogger("guardian-analyzer")
+
+Word = Tuple[int, int, int, int, str]
+
+
+class PDFPageOCR:
+    def __init__(
+        self,
+        ocr_cache: Optional[OCRCache] = None,
+        dpi: int = DEFAULT_OCR_DPI,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Per-page OCR for PDFs that mix text pages and scanned pages
+
+        Only pages that classify_page marks as scans are rasterized and
+        OCR'd. The recognised words are written back as an invisible text
+        layer, so every later get_text/search_for on the open document
+        (analysis and redaction alike) sees them without running OCR again.
+        Word lists are also kept in the OCR cache, keyed by page pixels.
+        """
+        self.ocr_cache = ocr_cache
+        self.dpi = dpi
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.settings = {"source": "pdf_page", "dpi": dpi, "min_conf": MIN_WORD_CONFIDENCE}
+
+    def pages_needing_ocr(self, doc: fitz.Document) -> List[int]:
+        return pages_needing_ocr(doc)
+
+    def rasterize_page(self, page: fitz.Page) -> np.ndarray:
+        return rasterize_page(page, self.dpi)
+
+    def ocr_words(self, image: np.ndarray, ocr_language: str = "eng") -> List[Word]:
+        """OCR a page image, returning (left, top, width, height, text) word boxes"""
+
+        def run_ocr():
+            # Lists rather than tuples, so cached and fresh words look the same
+            return {"words": [list(word) for word in ocr_words(image, ocr_language)]}
+
+        if self.ocr_cache is None:
+            return run_ocr()["words"]
+        key = self.ocr_cache.make_key(image, self.settings, ocr_language)
+        return self.ocr_cache.get_or_compute(key, run_ocr)["words"]
+
+    def ocr_document(
+        self,
+        doc: fitz.Document,
+        ocr_language: str = "eng",
+        pages: Optional[List[int]] = None,
+    ) -> Dict[int, int]:
+        """
+        Add an invisible OCR text layer to the scanned pages of an open document
+
+        Pages are OCR'd on a thread pool, see pdf_text_layer.add_ocr_text_layer,
+        through ocr_words and so the OCR cache. Returns the number of words
+        added per page number.
+        """
+        if pages is None:
+            pages = self.pages_needing_ocr(doc)
+        if not pages:
+            return {}
+
+        added = pdf_text_layer.add_ocr_text_layer(
+            doc,
+            pages,
+            self.dpi,
+            ocr_language,
+            self.max_workers,
+            ocr=self.ocr_words,
+        )
+        logger.info(f"OCR text layer added to {len(added)} of {len(doc)} pages")
+        return added
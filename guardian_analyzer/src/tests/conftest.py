@@ -0,0 +1,69 @@
+"""Shared fixtures for the Guardian service tests"""
+import sys
+import types
+
+import pytest
+
+try:
+    from guardian_analyzer import AnalyzerEngine  # noqa: F401
+except ImportError:
+    # The service modules only need the engine interfaces; without the
+    # analyzer package installed (from the repo root the service directory
+    # itself is found as a namespace package), a stand-in keeps them importable
+    guardian_analyzer = types.ModuleType("guardian_analyzer")
+
+    class AnalyzerEngine:
+        def analyze(self, text, language, entities=None, **kwargs):
+            return []
+
+    class AnalyzerRequest:
+        def __init__(self, req_data):
+            self.__dict__.update(req_data)
+
+    class AnalyzerEngineProvider:
+        def __init__(self, **kwargs):
+            pass
+
+        def create_engine(self):
+            return AnalyzerEngine()
+
+    guardian_analyzer.AnalyzerEngine = AnalyzerEngine
+    guardian_analyzer.AnalyzerRequest = AnalyzerRequest
+    guardian_analyzer.AnalyzerEngineProvider = AnalyzerEngineProvider
+    sys.modules["guardian_analyzer"] = guardian_analyzer
+
+
+class FakeEngine:
+    """Analyzer engine returning canned results, no NLP models are loaded"""
+
+    def __init__(self, results=()):
+        self.results = list(results)
+
+    def analyze(self, text, language, entities=None, **kwargs):
+        return self.results
+
+
+class FakeEngineProvider:
+    def __init__(self, **kwargs):
+        pass
+
+    def create_engine(self):
+        return FakeEngine()
+
+
+@pytest.fixture
+def fake_engine():
+    """The FakeEngine class, for tests that build their own redactors"""
+    return FakeEngine
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    import app
+
+    monkeypatch.setenv("DRM_DB_PATH", str(tmp_path / "drm.sqlite"))
+    monkeypatch.setattr(app, "AnalyzerEngineProvider", FakeEngineProvider)
+    monkeypatch.chdir(tmp_path)
+    srv = app.Server()
+    yield srv
+    srv.drm_manager.access_index.stop()
@@ -0,0 +1,67 @@
+"""Tests for opening JSON DRM containers"""
+import json
+
+import fitz
+import pytest
+from cryptography.fernet import Fernet
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Answers /verify with a fixed status and records the doc ids asked for"""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.doc_ids = []
+
+    def get(self, url, params=None, timeout=None):
+        self.doc_ids.append(params["doc_id"])
+        return FakeResponse(self.status_code)
+
+
+def write_container(path, pdf_bytes, doc_id="doc-1"):
+    key = Fernet.generate_key()
+    container = {
+        "metadata": {"doc_id": doc_id, "encryption_key": key.decode()},
+        "content": Fernet(key).encrypt(pdf_bytes).decode(),
+    }
+    path.write_text(json.dumps(container, indent=2))
+    return str(path)
+
+
+def sample_pdf(pages=3):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page()
+    return doc.tobytes()
+
+
+def test_open_drm_pdf_round_trip(server, tmp_path):
+    manager = server.drm_manager
+    manager.session = FakeSession()
+    path = write_container(tmp_path / "report.drm", sample_pdf())
+
+    doc = manager.open_drm_pdf(path)
+    assert doc.page_count == 3
+    assert manager.session.doc_ids == ["doc-1"]
+
+
+def test_open_drm_pdf_denied(server, tmp_path):
+    server.drm_manager.session = FakeSession(403)
+    path = write_container(tmp_path / "report.drm", sample_pdf())
+    with pytest.raises(Exception, match="Access denied"):
+        server.drm_manager.open_drm_pdf(path)
+
+
+def test_open_drm_pdf_rejects_other_files(server, tmp_path):
+    server.drm_manager.session = FakeSession()
+    path = tmp_path / "plain.pdf"
+    path.write_bytes(sample_pdf())
+    with pytest.raises(ValueError, match="Not a DRM container"):
+        server.drm_manager.open_drm_pdf(str(path))
+    # Rejected before any call to the DRM server
+    assert server.drm_manager.session.doc_ids == []
@@ -0,0 +1,84 @@
+"""Route tests for DRM PDF creation"""
+import io
+import os
+import re
+
+import fitz
+
+from drm_pdf_manager import add_document_javascript
+
+
+def sample_pdf():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Quarterly report")
+    doc.set_metadata({"title": "Report", "keywords": "finance"})
+    return doc.tobytes()
+
+
+def document_javascript(doc):
+    """Scripts of the Names/JavaScript name tree by name"""
+    kind, names = doc.xref_get_key(doc.pdf_catalog(), "Names/JavaScript/Names")
+    assert kind == "array"
+    scripts = {}
+    for name, xref in re.findall(r"\((.*?)\)\s*(\d+) 0 R", names):
+        assert doc.xref_get_key(int(xref), "S") == ("name", "/JavaScript")
+        script_xref = int(doc.xref_get_key(int(xref), "JS")[1].split()[0])
+        scripts[name] = doc.xref_stream(script_xref)
+    return scripts
+
+
+def test_create_drm_pdf(server):
+    client = server.app.test_client()
+    response = client.post(
+        "/create-drm-pdf",
+        data={
+            "file": (io.BytesIO(sample_pdf()), "report.pdf"),
+            "owner_id": "owner-1",
+            "expiry_date": "2999-01-01T00:00:00",
+        },
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.mimetype == "application/pdf"
+
+    doc = fitz.open(stream=response.data, filetype="pdf")
+    # Opens without a password, the owner password unlocks full rights
+    assert not doc.needs_pass
+    assert "AES" in doc.metadata["encryption"]
+    assert doc.metadata["title"] == "Report"
+    keywords = doc.metadata["keywords"].split()
+    assert keywords[0] == "finance"
+    doc_id = keywords[1].removeprefix("drm:")
+    assert b"/verify?doc_id=" + doc_id.encode() in document_javascript(doc)["drm_verify"]
+    assert doc.authenticate(server.drm_manager._owner_password(doc_id)) == 4
+
+    metadata = server.drm_manager.metadata_store.get(doc_id)
+    assert metadata["owner_id"] == "owner-1"
+    assert metadata["status"] == "active"
+    assert client.get("/verify", query_string={"doc_id": doc_id}).status_code == 200
+
+    # Neither the upload nor the protected PDF is left behind
+    assert not os.listdir("temp/input")
+    assert not os.path.exists("temp/output")
+
+
+def test_create_drm_pdf_needs_owner(server):
+    response = server.app.test_client().post(
+        "/create-drm-pdf",
+        data={"file": (io.BytesIO(sample_pdf()), "report.pdf")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 400
+
+
+def test_add_document_javascript_keeps_existing_scripts():
+    doc = fitz.open()
+    doc.new_page()
+    add_document_javascript(doc, "existing", "app.alert('hi');")
+    add_document_javascript(doc, "drm_verify", "checkAccess();")
+
+    doc = fitz.open(stream=doc.tobytes(), filetype="pdf")
+    assert document_javascript(doc) == {
+        "drm_verify": b"checkAccess();",
+        "existing": b"app.alert('hi');",
+    }
@@ -0,0 +1,97 @@
+"""Tests for in-place image redaction and encoding"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+import pytest
+
+from image_redactor import (
+    PresidioImageRedactor,
+    blur_regions,
+    fill_regions,
+    pixelate_regions,
+)
+
+Result = namedtuple("Result", "entity_type start end score")
+
+TEXT = "Mail jane@example.com today"
+BOXES = {
+    "text": ["Mail", "jane@example.com", "today"],
+    "left": [2, 20, 60],
+    "top": [4, 4, 4],
+    "width": [14, 36, 20],
+    "height": [10, 10, 10],
+}
+
+
+def noisy_image(height=40, width=90):
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), np.uint8)
+
+
+@pytest.fixture
+def make_redactor(monkeypatch, fake_engine):
+    def make(results=()):
+        redactor = PresidioImageRedactor(fake_engine(results))
+        monkeypatch.setattr(
+            redactor, "ocr_image", lambda image, lang="eng": {"text": TEXT, "boxes": BOXES}
+        )
+        return redactor
+
+    return make
+
+
+def test_fill_regions_uses_rgb_color_in_place():
+    image = np.zeros((20, 20, 3), np.uint8)
+    assert fill_regions(image, [(2, 3, 4, 5)], (255, 0, 0)) is image
+    # The color is given as RGB, the array is BGR
+    assert (image[3:8, 2:6] == (0, 0, 255)).all()
+    assert image[:3].sum() == 0 and image[8:].sum() == 0
+
+
+@pytest.mark.parametrize("redact", [blur_regions, pixelate_regions])
+def test_region_effects_stay_inside_regions(redact):
+    image = noisy_image()
+    original = image.copy()
+    assert redact(image, [(10, 5, 30, 20), (80, 30, 40, 40)]) is image
+
+    inside = (slice(5, 25), slice(10, 40))
+    assert not np.array_equal(image[inside], original[inside])
+    outside = np.ones(image.shape[:2], bool)
+    outside[inside] = False
+    outside[30:, 80:] = False
+    assert np.array_equal(image[outside], original[outside])
+
+
+def test_redact_image_array_fills_entity_words(make_redactor):
+    redactor = make_redactor([Result("EMAIL_ADDRESS", 5, 21, 1.0)])
+    image = noisy_image()
+    result = redactor.redact_image_array(image, ".png", return_bytes=True)
+
+    assert result["detected_entities"] == ["jane@example.com"]
+    assert result["redacted_regions"] == 1
+    assert result["mimetype"] == "image/png"
+    assert (image[4:14, 20:56] == 0).all()
+
+    # PNG is lossless, the encoded bytes are the redacted array
+    decoded = cv2.imdecode(np.frombuffer(result["image_bytes"], np.uint8), cv2.IMREAD_COLOR)
+    assert np.array_equal(decoded, image)
+
+
+def test_redact_image_array_without_entities_keeps_pixels(make_redactor):
+    redactor = make_redactor()
+    image = noisy_image()
+    original = image.copy()
+    result = redactor.redact_image_array(image, ".jpeg", return_bytes=True)
+
+    assert result["redacted_regions"] == 0
+    assert result["mimetype"] == "image/jpeg"
+    assert np.array_equal(image, original)
+    assert result["image_bytes"][:2] == b"\xff\xd8"
+
+
+def test_redact_image_array_rejects_unknown_mode(make_redactor):
+    redactor = make_redactor()
+    with pytest.raises(ValueError):
+        redactor.redact_image_array(noisy_image(), redaction_mode="smudge", return_bytes=True)
+    with pytest.raises(ValueError):
+        redactor.redact_image_array(noisy_image())
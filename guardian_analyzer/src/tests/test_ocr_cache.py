@@ -0,0 +1,117 @@
+"""Tests for the two-tier OCR result cache"""
+import json
+import os
+
+import numpy as np
+
+from ocr_cache import OCRCache
+
+
+def entry(n, size=100):
+    """A result that serialises to exactly size bytes"""
+    value = {"text": "", "id": n}
+    value["text"] = "x" * (size - len(json.dumps(value)))
+    assert len(json.dumps(value)) == size
+    return value
+
+
+def disk_usage(cache_dir):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(cache_dir)
+        for name in names
+    )
+
+
+def test_make_key_covers_pixels_settings_and_language():
+    image = np.zeros((4, 4), np.uint8)
+    key = OCRCache.make_key(image, {"dpi": 300}, "eng")
+    assert key == OCRCache.make_key(image.copy(), {"dpi": 300}, "eng")
+    assert key != OCRCache.make_key(image + 1, {"dpi": 300}, "eng")
+    assert key != OCRCache.make_key(image, {"dpi": 200}, "eng")
+    assert key != OCRCache.make_key(image, {"dpi": 300}, "deu")
+    assert key != OCRCache.make_key(image.reshape(2, 8), {"dpi": 300}, "eng")
+
+
+def test_lru_eviction_order():
+    cache = OCRCache(max_bytes=250)
+    cache.put("a", entry("a"))
+    cache.put("b", entry("b"))
+    assert cache.get("a") is not None  # a is now the most recently used
+    cache.put("c", entry("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 200
+
+
+def test_byte_cap_and_overwrites():
+    cache = OCRCache(max_bytes=250)
+    cache.put("a", entry("a"))
+    cache.put("a", entry("a", 150))
+    assert cache.stats()["bytes"] == 150
+
+    # Larger than the whole cache, not kept in memory at all
+    cache.put("big", entry("big", 300))
+    assert cache.get("big") is None
+    assert cache.stats()["bytes"] == 150
+
+
+def test_stats_and_get_or_compute():
+    cache = OCRCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return entry("a")
+
+    assert cache.get_or_compute("a", compute) == entry("a")
+    assert cache.get_or_compute("a", compute) == entry("a")
+    assert len(calls) == 1
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["disk_enabled"] is False
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 0
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    OCRCache(cache_dir=str(tmp_path)).put("ab12", entry("a"))
+
+    cache = OCRCache(cache_dir=str(tmp_path))
+    assert cache._disk_bytes == 100
+    assert cache.get("ab12") == entry("a")
+    # Promoted into memory, the second lookup does not touch the disk
+    assert cache.get("ab12") == entry("a")
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["entries"] == 1
+
+
+def test_disk_overwrite_replaces_size(tmp_path):
+    cache = OCRCache(cache_dir=str(tmp_path))
+    cache.put("ab12", entry("a"))
+    cache.put("ab12", entry("a", 150))
+    cache.put("cd34", entry("c"))
+    assert cache._disk_bytes == disk_usage(tmp_path) == 250
+
+
+def test_disk_pruned_oldest_first(tmp_path):
+    cache = OCRCache(cache_dir=str(tmp_path), max_disk_bytes=350)
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, entry(key))
+        # Distinct, increasing mtimes whatever the filesystem resolution
+        os.utime(cache._disk_path(key), (1000 + i, 1000 + i))
+    cache.put("dd04", entry("dd04"))
+
+    # Pruned down to 90% of the cap, the oldest entries go first
+    assert not os.path.exists(cache._disk_path("aa01"))
+    for key in ["bb02", "cc03", "dd04"]:
+        assert os.path.exists(cache._disk_path(key))
+    assert cache._disk_bytes == disk_usage(tmp_path) == 300
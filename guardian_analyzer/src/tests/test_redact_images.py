@@ -0,0 +1,83 @@
+"""Tests for the streamed /redact-images batch endpoint"""
+import io
+import json
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+NO_WORDS = {"text": [], "left": [], "top": [], "width": [], "height": []}
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    # No Tesseract needed, every image reads as blank
+    monkeypatch.setattr(
+        server.image_redactor,
+        "ocr_image",
+        lambda image, lang="eng": {"text": "", "boxes": NO_WORDS},
+    )
+    return server.app.test_client()
+
+
+def png_bytes():
+    ok, buffer = cv2.imencode(".png", np.full((8, 8, 3), 200, np.uint8))
+    return buffer.tobytes()
+
+
+def make_zip(members):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    return data.getvalue()
+
+
+def post(client, files=(), archive=None):
+    data = {"files": [(io.BytesIO(content), name) for name, content in files]}
+    if archive is not None:
+        data["archive"] = (io.BytesIO(archive), "batch.zip")
+    return client.post("/redact-images", data=data, content_type="multipart/form-data")
+
+
+def test_streams_redacted_archive(client):
+    archive = make_zip(
+        {"scans/a.png": png_bytes(), "b.png": b"not an image", "notes.txt": b"skip"}
+    )
+    response = post(client, [("upload.png", png_bytes())], archive)
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as zf:
+        assert zf.testzip() is None
+        names = set(zf.namelist())
+        assert names == {
+            "0000_upload.png",
+            "0000_upload.png.json",
+            "0001_a.png",
+            "0001_a.png.json",
+            "0002_b.png.json",
+        }
+
+        for name in ("0000_upload.png", "0001_a.png"):
+            decoded = cv2.imdecode(np.frombuffer(zf.read(name), np.uint8), cv2.IMREAD_COLOR)
+            assert decoded.shape == (8, 8, 3)
+            assert json.loads(zf.read(f"{name}.json"))["status"] == "success"
+
+        # A member that fails is reported, the batch goes on
+        failed = json.loads(zf.read("0002_b.png.json"))
+        assert failed["status"] == "error"
+        assert failed["source"] == "b.png"
+
+
+def test_rejects_invalid_archive_before_streaming(client):
+    response = post(client, archive=b"PK\x03\x04 truncated")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid zip archive"
+
+
+def test_rejects_archive_without_images(client):
+    response = post(client, archive=make_zip({"notes.txt": b"x"}))
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "No images found in archive"
@@ -0,0 +1,69 @@
+"""Tests for streaming uploads to disk"""
+import hashlib
+import io
+import os
+
+import fitz
+import pytest
+
+from upload_ingest import ingest_upload
+
+CORRUPT_PDF = b"%PDF-1.7\n" + b"not a pdf body\n" * 100
+
+
+class FailingStream(io.BytesIO):
+    """Stands in for a client that disconnects after the first chunk"""
+
+    def read(self, size=-1):
+        if self.tell():
+            raise ConnectionError("client went away")
+        return super().read(size)
+
+
+def test_ingest_counts_pdf_pages(tmp_path):
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page()
+    data = doc.tobytes()
+
+    upload = ingest_upload(io.BytesIO(data), str(tmp_path / "in" / "a.pdf"), chunk_size=64)
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.pages == 2
+    assert upload.headers()["X-Upload-Pages"] == "2"
+    assert (tmp_path / "in" / "a.pdf").read_bytes() == data
+
+
+def test_ingest_corrupt_pdf_has_no_page_count(tmp_path):
+    path = tmp_path / "bad.pdf"
+    upload = ingest_upload(io.BytesIO(CORRUPT_PDF), str(path))
+    assert upload.pages is None
+    assert "X-Upload-Pages" not in upload.headers()
+    # Still on disk, the route that ingested it removes it
+    assert path.read_bytes() == CORRUPT_PDF
+
+
+def test_ingest_removes_partial_file(tmp_path):
+    path = tmp_path / "partial.pdf"
+    with pytest.raises(ConnectionError):
+        ingest_upload(FailingStream(CORRUPT_PDF), str(path), chunk_size=16)
+    assert not path.exists()
+
+
+@pytest.mark.parametrize(
+    "route, form",
+    [
+        ("/create-drm-pdf", {"owner_id": "owner-1"}),
+        ("/encrypt-pdf", {"password": "secret"}),
+        ("/redact-document", {}),
+    ],
+)
+def test_corrupt_pdf_upload_is_cleaned_up(server, route, form):
+    response = server.app.test_client().post(
+        route,
+        data={"file": (io.BytesIO(CORRUPT_PDF), "bad.pdf"), **form},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code >= 400
+    assert "error" in response.get_json()
+    assert not os.listdir("temp/input")
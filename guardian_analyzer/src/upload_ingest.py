@@ -0,0 +1,82 @@
+import os
+import hashlib
+import logging
+from typing import BinaryIO, Optional
+
+import fitz
+
+logger = logging.getLogger("guardian-analyzer")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class IngestedFile:
+    """An upload written to disk, with what was learned while writing it"""
+
+    def __init__(self, path: str, size: int, sha256: str, pages: Optional[int]):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        # None for anything that is not a PDF
+        self.pages = pages
+
+    def headers(self) -> dict:
+        headers = {"X-Upload-Size": str(self.size), "X-Upload-SHA256": self.sha256}
+        if self.pages is not None:
+            headers["X-Upload-Pages"] = str(self.pages)
+        return headers
+
+
+def ingest_upload(file, path: str, chunk_size: int = CHUNK_SIZE) -> IngestedFile:
+    """
+    Stream an upload (a werkzeug FileStorage or binary stream) to path
+
+    The SHA-256 and size are computed on the chunks as they are written,
+    so the file is never read back or held in memory as a whole. PDFs
+    are then opened once to count their pages, which only parses the
+    cross-reference table. A PDF that cannot be opened gets pages None
+    and is left for the route to reject, and a failed write removes the
+    partial file, so every error after this returns leaves the upload to
+    the route's own cleanup.
+    """
+    stream = getattr(file, "stream", file)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0:
+                    head = chunk[:1024]
+                sha256.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        # e.g. the client disconnected mid-upload
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    pages = None
+    # PDF readers accept the header anywhere in the first kilobyte
+    if b"%PDF-" in head:
+        try:
+            with fitz.open(path) as doc:
+                pages = doc.page_count
+        except RuntimeError as e:  # fitz.FileDataError and older PyMuPDF errors
+            logger.warning(f"Could not count pages of {path}: {e}")
+    return IngestedFile(path, size, sha256.hexdigest(), pages)
+
+
+def sha256_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """SHA-256 of a file on disk, read in chunks"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -1,18 +1,56 @@
-from flask import Flask, request, jsonify, Response
-from presidio_analyzer import AnalyzerEngine
+import json
+
+from flask import Flask, request, jsonify, Response, stream_with_context
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig
-from presidio_image_redactor import ImageRedactorEngine
+from presidio_image_redactor import ImageAnalyzerEngine, ImageRedactorEngine
 from presidio_image_redactor.entities import InvalidParamError
 
 from PIL import Image
 from io import BytesIO
 
+from stream_anonymizer import anonymize_stream, iter_ndjson, iter_text, iter_windows
+
 app = Flask(__name__)
 
 # Initialize engines
 analyzer = AnalyzerEngine()
+batch_analyzer = BatchAnalyzerEngine(analyzer_engine=analyzer)
 anonymizer = AnonymizerEngine()
+# Built once on the shared analyzer instead of a new engine per request
+image_redactor = ImageRedactorEngine(
+    image_analyzer_engine=ImageAnalyzerEngine(analyzer_engine=analyzer)
+)
+
+
+def warm_up_image_redactor():
+    """Run one tiny redaction so the first request does not pay for OCR start-up"""
+    try:
+        image_redactor.redact(Image.new("RGB", (64, 64), "white"), (0, 0, 0))
+    except Exception as e:
+        print(f"Image redactor warm-up failed: {e}")
+
+
+warm_up_image_redactor()
+
+REDACT_OPERATORS = {"DEFAULT": OperatorConfig("replace", {"new_value": "<REDACTED>"})}
+
+# Texts per NLP batch for the batch endpoint
+BATCH_SIZE = 32
+
+
+def analysis_response(text, analyzer_results):
+    """Findings, anonymized and redacted text of one analysis"""
+    return {
+        "results": [result.to_dict() for result in analyzer_results],
+        "anonymized_text": anonymizer.anonymize(
+            text=text, analyzer_results=analyzer_results
+        ).text,
+        "redacted_text": anonymizer.anonymize(
+            text=text, analyzer_results=analyzer_results, operators=REDACT_OPERATORS
+        ).text,
+    }
 
 
 @app.route("/analyze", methods=["POST"])
@@ -20,12 +58,13 @@ def analyze():
     try:
         data = request.get_json()
         text = data.get("text")
+        language = data.get("language", "en")
 
         if not text:
             return jsonify({"error": "No text provided"}), 400
 
         # Analyze text
-        analyzer_results = analyzer.analyze(text=text, language="en")
+        analyzer_results = analyzer.analyze(text=text, language=language)
 
         return jsonify({"results": [result.to_dict() for result in analyzer_results]})
 
@@ -39,12 +78,13 @@ def process():
         data = request.get_json()
         text = data.get("text")
         action = data.get("action", "anonymize")  # 'anonymize' or 'redact'
+        language = data.get("language", "en")
 
         if not text:
             return jsonify({"error": "No text provided"}), 400
 
         # First analyze the text
-        analyzer_results = analyzer.analyze(text=text, language="en")
+        analyzer_results = analyzer.analyze(text=text, language=language)
 
         if action == "anonymize":
             # Anonymize the detected PII
@@ -57,11 +97,10 @@ def process():
 
         elif action == "redact":
             # Redact the detected PII
-            operator_config = OperatorConfig("replace", {"new_value": "<REDACTED>"})
             redacted_result = anonymizer.anonymize(
                 text=text,
                 analyzer_results=analyzer_results,
-                operators={"DEFAULT": operator_config},
+                operators=REDACT_OPERATORS,
             )
             return jsonify(
                 {"original_text": text, "processed_text": redacted_result.text}
@@ -74,6 +113,138 @@ def process():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/process/stream", methods=["POST"])
+def process_stream():
+    """
+    Anonymize a request body of any size, streaming the output back
+
+    A text/plain body is treated as one text and answered with plain text.
+    An application/x-ndjson body holds one {"text": ...} record per line
+    and is answered with one {"processed_text": ...} line per record,
+    keeping an "id" if given. A record that cannot be processed is answered
+    with {"id": ..., "error": ..., "line": ...} and the stream goes on.
+    Query parameters: action (anonymize or redact), language, and echo=true
+    to include the input in the output.
+    """
+    action = request.args.get("action", "anonymize")
+    language = request.args.get("language", "en")
+    echo = request.args.get("echo", "false").lower() == "true"
+
+    if action not in ("anonymize", "redact"):
+        return jsonify({"error": "Invalid action specified"}), 400
+    operators = REDACT_OPERATORS if action == "redact" else None
+
+    def anonymize(chunks, with_original=False):
+        return anonymize_stream(
+            chunks,
+            analyzer,
+            anonymizer,
+            language=language,
+            operators=operators,
+            with_original=with_original,
+        )
+
+    if request.mimetype == "application/x-ndjson":
+
+        def records():
+            # The 200 is already sent, so a bad record is answered on its own
+            # line instead of ending the stream
+            for line_number, record in iter_ndjson(request.stream):
+                output = {}
+                try:
+                    if isinstance(record, ValueError):
+                        raise ValueError(f"Invalid JSON: {record}")
+                    if not isinstance(record, dict):
+                        raise ValueError("Record must be a JSON object")
+                    if "id" in record:
+                        output["id"] = record["id"]
+                    text = record.get("text") or ""
+                    if not isinstance(text, str):
+                        raise ValueError("text must be a string")
+                    # Long records are analyzed window by window as well
+                    output["processed_text"] = "".join(anonymize(iter_windows(text)))
+                    if echo:
+                        output["original_text"] = text
+                except Exception as e:
+                    output.setdefault("id", None)
+                    output.update({"error": str(e), "line": line_number})
+                yield json.dumps(output) + "\n"
+
+        return Response(
+            stream_with_context(records()), mimetype="application/x-ndjson"
+        )
+
+    if echo:
+        # Each output piece is paired with the input it came from
+        def pieces():
+            for original, processed in anonymize(
+                iter_text(request.stream), with_original=True
+            ):
+                yield json.dumps(
+                    {"original_text": original, "processed_text": processed}
+                ) + "\n"
+
+        return Response(
+            stream_with_context(pieces()), mimetype="application/x-ndjson"
+        )
+
+    return Response(
+        stream_with_context(anonymize(iter_text(request.stream))),
+        mimetype="text/plain",
+    )
+
+
+@app.route("/analyze-anonymize", methods=["POST"])
+def analyze_anonymize():
+    """Findings, anonymized text and redacted text from a single analysis"""
+    try:
+        data = request.get_json()
+        text = data.get("text")
+        language = data.get("language", "en")
+
+        if not text:
+            return jsonify({"error": "No text provided"}), 400
+
+        analyzer_results = analyzer.analyze(
+            text=text, language=language, entities=data.get("entities")
+        )
+        return jsonify(analysis_response(text, analyzer_results))
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/analyze-anonymize/batch", methods=["POST"])
+def analyze_anonymize_batch():
+    """Same as /analyze-anonymize for a list of texts, analyzed in NLP batches"""
+    try:
+        data = request.get_json()
+        texts = data.get("texts")
+        language = data.get("language", "en")
+
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return jsonify({"error": "texts must be a list of strings"}), 400
+
+        # The NLP pipeline runs once per batch of texts instead of once per text
+        all_results = batch_analyzer.analyze_iterator(
+            texts,
+            language=language,
+            batch_size=BATCH_SIZE,
+            entities=data.get("entities"),
+        )
+        return jsonify(
+            {
+                "results": [
+                    analysis_response(text, analyzer_results)
+                    for text, analyzer_results in zip(texts, all_results)
+                ]
+            }
+        )
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/process-image", methods=["POST"])
 def process_image():
     """Process an uploaded image for redaction."""
@@ -88,11 +259,8 @@ def process_image():
         # Get fill color (default to 'contrast')
         color_fill = request.form.get("fill")
 
-        # Initialize the redactor engine if not already done
-        engine = ImageRedactorEngine()
-
         # Perform redaction
-        redacted_image = engine.redact(im, color_fill, score_threshold=0.4)
+        redacted_image = image_redactor.redact(im, color_fill, score_threshold=0.4)
 
         # Convert to byte array for response
         img_byte_arr = BytesIO()
@@ -0,0 +1,415 @@
+"""
+Offline PII analysis of a JSONL or CSV corpus
+
+Records are read as a stream, analyzed in batches by a pool of worker
+processes that each hold one warmed-up analyzer engine, and written to
+numbered JSONL or Parquet shards. A checkpoint is written whenever a shard
+is complete, so a killed run started again with the same arguments
+resumes after the last complete shard; the checkpoint also records those
+arguments, and a run with different ones refuses to reuse the directory.
+Records that cannot be read or analyzed are written with their index to
+numbered errors-NNNNN.jsonl files instead of stopping the run.
+
+    python batch_analyze.py tickets.jsonl out/ --text-field body --id-field ticket_id
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from process import extract_entities_with_text
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+# Arguments that change which records land in which shard, or what a row
+# holds; a checkpoint is only resumed with the same values
+RUN_SETTINGS = (
+    "input",
+    "input_format",
+    "text_field",
+    "id_field",
+    "output_format",
+    "shard_size",
+    "keep_text",
+    "language",
+    "entities",
+    "score_threshold",
+)
+
+# A JSONL line that could not be parsed, passed on to be quarantined
+InvalidLine = namedtuple("InvalidLine", "text error")
+
+# Set in each worker process by init_worker
+_batch_analyzer = None
+_analyze_kwargs = {}
+
+
+def read_records(path, file_format):
+    """Yield the records of a JSONL or CSV file one at a time"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            # Ticket bodies easily exceed the default 128 KB field limit
+            csv.field_size_limit(sys.maxsize)
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield InvalidLine(line.rstrip("\n"), f"Invalid JSON: {e}")
+
+
+def init_worker(language, entities, score_threshold):
+    """Build and warm up this process's analyzer, once"""
+    global _batch_analyzer, _analyze_kwargs
+    from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+
+    _batch_analyzer = BatchAnalyzerEngine(analyzer_engine=AnalyzerEngine())
+    _analyze_kwargs = {
+        "language": language,
+        "entities": entities,
+        "score_threshold": score_threshold,
+    }
+    # Loads the NLP model and compiles recognizers before real work arrives
+    _batch_analyzer.analyzer_engine.analyze(
+        text="John Smith lives in Paris", language=language
+    )
+
+
+def record_error(record, id_field):
+    """Why a record cannot be analyzed, or None"""
+    if isinstance(record, InvalidLine):
+        return record.error
+    if not isinstance(record, dict):
+        return "Record must be a JSON object"
+    if id_field and id_field not in record:
+        return f"Missing id field {id_field!r}"
+    return None
+
+
+def analyze_texts(texts):
+    """
+    Analyzer results per text, or the exception a text failed with
+
+    The texts are analyzed as one batch. Only if that fails are they
+    analyzed one by one, to find out which of them is at fault.
+    """
+    if not texts:
+        return []
+    try:
+        return list(
+            _batch_analyzer.analyze_iterator(
+                texts, batch_size=len(texts), **_analyze_kwargs
+            )
+        )
+    except Exception:
+        pass
+
+    all_results = []
+    for text in texts:
+        try:
+            all_results.append(
+                _batch_analyzer.analyzer_engine.analyze(text=text, **_analyze_kwargs)
+            )
+        except Exception as e:
+            all_results.append(e)
+    return all_results
+
+
+def analyze_batch(batch, text_field, id_field, keep_text):
+    """
+    Analyze (index, record) pairs, returning one output row each
+
+    A record that cannot be read or analyzed gives an error row
+    {"index", "error", "record"} instead of failing the whole batch.
+    """
+    output = []
+    valid = []
+    for index, record in batch:
+        error = record_error(record, id_field)
+        if error:
+            output.append(error_row(index, record, error))
+        else:
+            valid.append((index, record))
+            output.append(None)
+
+    texts = [str(record.get(text_field) or "") for _, record in valid]
+    rows = (
+        output_row(index, record, text, results, id_field, keep_text)
+        for (index, record), text, results in zip(valid, texts, analyze_texts(texts))
+    )
+    # Error rows stay in place, the output is in input order
+    return [row if row is not None else next(rows) for row in output]
+
+
+def output_row(index, record, text, results, id_field, keep_text):
+    if isinstance(results, Exception):
+        return error_row(index, record, f"Analysis failed: {results}")
+    entities = [
+        {
+            "entity_type": r.entity_type,
+            "start": r.start,
+            "end": r.end,
+            "score": float(r.score),
+        }
+        for r in results
+    ]
+    row = {
+        "id": str(record[id_field]) if id_field else str(index),
+        "entities": extract_entities_with_text(text, entities),
+    }
+    if keep_text:
+        row["text"] = text
+    return row
+
+
+def error_row(index, record, error):
+    if isinstance(record, InvalidLine):
+        record = record.text
+    return {"index": index, "error": error, "record": record}
+
+
+class ShardWriter:
+    """
+    Writes numbered shards atomically and keeps the checkpoint in step
+
+    A shard is written once it has shard_size rows, error rows going to a
+    numbered errors file written at the same time, so a checkpoint always
+    covers both. Error rows count toward a cap of twice shard_size, which
+    flushes a shorter shard (or only an errors file) when most records fail.
+    """
+
+    def __init__(
+        self,
+        out_dir,
+        output_format,
+        shard_size,
+        records_done=0,
+        shards=0,
+        errors=0,
+        error_files=0,
+        settings=None,
+    ):
+        self.out_dir = out_dir
+        self.output_format = output_format
+        self.shard_size = shard_size
+        self.max_rows = 2 * shard_size
+        self.records_done = records_done
+        self.shards = shards
+        self.errors = errors
+        self.error_files = error_files
+        # Saved with every checkpoint, see check_settings
+        self.settings = settings or {}
+        # Rows and error rows in input order, and how many are not errors
+        self.rows = []
+        self.good_rows = 0
+
+        if output_format == "parquet":
+            # Optional dependency, only needed for Parquet output
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+
+            self._pa = pyarrow
+            self._pq = pyarrow.parquet
+
+    def add(self, rows):
+        for row in rows:
+            self.rows.append(row)
+            if "error" not in row:
+                self.good_rows += 1
+            if self.good_rows == self.shard_size or len(self.rows) >= self.max_rows:
+                self._flush()
+
+    def close(self):
+        if self.rows:
+            self._flush()
+
+    def _flush(self):
+        rows = [row for row in self.rows if "error" not in row]
+        errors = [row for row in self.rows if "error" in row]
+        if errors:
+            self._write_jsonl(f"errors-{self.error_files:05d}.jsonl", errors)
+            self.error_files += 1
+        if rows:
+            ext = "parquet" if self.output_format == "parquet" else "jsonl"
+            name = f"part-{self.shards:05d}.{ext}"
+            if self.output_format == "parquet":
+                path = os.path.join(self.out_dir, name)
+                self._pq.write_table(self._pa.Table.from_pylist(rows), path + ".tmp")
+                os.replace(path + ".tmp", path)
+            else:
+                self._write_jsonl(name, rows)
+            self.shards += 1
+
+        self.records_done += len(self.rows)
+        self.errors += len(errors)
+        self.rows = []
+        self.good_rows = 0
+        save_checkpoint(
+            self.out_dir,
+            {
+                "records_done": self.records_done,
+                "shards": self.shards,
+                "errors": self.errors,
+                "error_files": self.error_files,
+                "settings": self.settings,
+            },
+        )
+
+    def _write_jsonl(self, name, rows):
+        path = os.path.join(self.out_dir, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        # A file only appears under its name once complete
+        os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(out_dir):
+    """The saved checkpoint dict, or None when the run starts afresh"""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(out_dir, checkpoint):
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_settings(args, file_format):
+    settings = {name: getattr(args, name, None) for name in RUN_SETTINGS}
+    # The same corpus may be given relative to another working directory
+    settings["input"] = os.path.abspath(args.input)
+    settings["input_format"] = file_format
+    return settings
+
+
+def check_settings(checkpoint, settings):
+    """Refuse to resume a checkpoint written by a run with other arguments"""
+    saved = checkpoint.get("settings")
+    if saved is None:
+        raise SystemExit(
+            "The checkpoint does not record its run's arguments, "
+            "use a new output directory"
+        )
+    changed = [name for name in RUN_SETTINGS if saved.get(name) != settings[name]]
+    if changed:
+        details = ", ".join(
+            f"{name}: {saved.get(name)!r} != {settings[name]!r}" for name in changed
+        )
+        raise SystemExit(
+            f"The output directory holds a checkpoint for another run ({details}), "
+            "use a new output directory or the original arguments"
+        )
+
+
+def iter_batches(records, batch_size, start):
+    """(index, record) batches, skipping the first start records"""
+    indexed = enumerate(records)
+    for _ in islice(indexed, start):
+        pass
+    while True:
+        batch = list(islice(indexed, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def run(args):
+    os.makedirs(args.out_dir, exist_ok=True)
+    file_format = args.input_format or (
+        "csv" if args.input.lower().endswith(".csv") else "jsonl"
+    )
+    settings = run_settings(args, file_format)
+    checkpoint = load_checkpoint(args.out_dir) or {}
+    if checkpoint:
+        check_settings(checkpoint, settings)
+        print(
+            f"Resuming after {checkpoint['records_done']} records "
+            f"({checkpoint['shards']} shards, {checkpoint['errors']} failed)"
+        )
+
+    writer = ShardWriter(
+        args.out_dir,
+        args.output_format,
+        args.shard_size,
+        checkpoint.get("records_done", 0),
+        checkpoint.get("shards", 0),
+        checkpoint.get("errors", 0),
+        checkpoint.get("error_files", 0),
+        settings,
+    )
+    batches = iter_batches(
+        read_records(args.input, file_format), args.batch_size, writer.records_done
+    )
+
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        workers,
+        initializer=init_worker,
+        initargs=(args.language, args.entities, args.score_threshold),
+    ) as executor:
+        # Bounded look-ahead keeps memory flat however large the corpus is,
+        # and results are written in input order so the checkpoint is a count
+        pending = deque()
+        for batch in batches:
+            if len(pending) >= workers * 2:
+                writer.add(pending.popleft().result())
+            pending.append(
+                executor.submit(
+                    analyze_batch,
+                    batch,
+                    args.text_field,
+                    args.id_field,
+                    args.keep_text,
+                )
+            )
+        while pending:
+            writer.add(pending.popleft().result())
+    writer.close()
+    print(f"Analyzed {writer.records_done} records into {writer.shards} shards")
+    if writer.errors:
+        print(f"{writer.errors} records failed, see the errors-*.jsonl files")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split("\n\n")[0]
+    )
+    parser.add_argument("input", help="JSONL or CSV corpus")
+    parser.add_argument("out_dir", help="Directory for shards and the checkpoint")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"])
+    parser.add_argument(
+        "--output-format", choices=["jsonl", "parquet"], default="jsonl"
+    )
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument(
+        "--id-field", help="Record field to use as id, else the record index"
+    )
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--entities", nargs="*", help="Only look for these entities")
+    parser.add_argument("--score-threshold", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--shard-size", type=int, default=100000)
+    parser.add_argument(
+        "--keep-text", action="store_true", help="Copy the analyzed text to the output"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
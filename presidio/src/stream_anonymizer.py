@@ -0,0 +1,125 @@
+import codecs
+import json
+
+# Characters analyzed at once, and how many of them are held back and
+# analyzed again with the next window so entities at the edge keep context
+WINDOW_SIZE = 20000
+WINDOW_OVERLAP = 500
+
+READ_SIZE = 64 * 1024
+
+
+def iter_text(stream, read_size=READ_SIZE):
+    """Decode a UTF-8 byte stream chunk by chunk, never splitting a character"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for data in iter(lambda: stream.read(read_size), b""):
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson(stream):
+    """
+    Parse one JSON record per non-empty line of a byte stream
+
+    Yields (line number, record). A line that is not valid JSON is yielded
+    with the ValueError in place of the record, so the caller can report it
+    and carry on with the next line.
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+def iter_windows(text, window=WINDOW_SIZE):
+    """Split a text held in memory into window sized chunks for anonymize_stream"""
+    for start in range(0, len(text), window):
+        yield text[start : start + window]
+
+
+def window_cut(text, analyzer_results, overlap=WINDOW_OVERLAP):
+    """
+    Where to split a window: overlap characters before its end, moved back
+    to whitespace and then before any entity that would be cut in two
+    """
+    cut = len(text) - overlap
+    # Only look back a bounded distance, text without spaces is cut anyway
+    for i in range(cut, max(0, cut - overlap), -1):
+        if text[i - 1].isspace():
+            cut = i
+            break
+
+    while True:
+        spanning = [r.start for r in analyzer_results if r.start < cut < r.end]
+        if not spanning:
+            return cut
+        cut = min(spanning)
+
+
+def anonymize_stream(
+    chunks,
+    analyzer,
+    anonymizer,
+    language="en",
+    operators=None,
+    entities=None,
+    window=WINDOW_SIZE,
+    overlap=WINDOW_OVERLAP,
+    with_original=False,
+):
+    """
+    Anonymize a text given as an iterable of chunks, yielding the output
+    piece by piece
+
+    The text is analyzed window characters at a time. The part of each
+    window before the cut is anonymized and yielded, and the rest is
+    carried into the next window, so entities near or across a window
+    boundary are detected with their full context. Only a single entity
+    longer than a window makes the window grow.
+    With with_original, (original, anonymized) pairs are yielded instead.
+    """
+    buffer = ""
+    # Start of the text not yet yielded; the buffer is only sliced when a
+    # chunk arrives, so a huge chunk is not copied again for every window
+    start = 0
+    limit = window
+    for chunk in chunks:
+        buffer = buffer[start:] + chunk
+        start = 0
+        while len(buffer) - start >= limit:
+            # Large chunks are worked through one window at a time
+            view = buffer[start : start + limit]
+            results = analyzer.analyze(
+                text=view, language=language, entities=entities
+            )
+            cut = window_cut(view, results, overlap)
+            if cut <= 0:
+                # One entity spans the whole window, widen it until the entity ends
+                limit += window
+                continue
+            anonymized = anonymizer.anonymize(
+                text=view[:cut],
+                analyzer_results=[r for r in results if r.end <= cut],
+                operators=operators,
+            ).text
+            yield (view[:cut], anonymized) if with_original else anonymized
+            start += cut
+            limit = window
+
+    buffer = buffer[start:]
+    if buffer:
+        results = analyzer.analyze(
+            text=buffer, language=language, entities=entities
+        )
+        anonymized = anonymizer.anonymize(
+            text=buffer, analyzer_results=results, operators=operators
+        ).text
+        yield (buffer, anonymized) if with_original else anonymized
@@ -0,0 +1,147 @@
+"""Tests for the single-pass analyze+anonymize and streaming endpoints"""
+import importlib.util
+import json
+import os
+import re
+import sys
+import types
+
+import pytest
+
+PRESIDIO_MODULES = {
+    "presidio_analyzer": ["AnalyzerEngine", "BatchAnalyzerEngine"],
+    "presidio_anonymizer": ["AnonymizerEngine"],
+    "presidio_anonymizer.entities": ["OperatorConfig"],
+    "presidio_image_redactor": ["ImageAnalyzerEngine", "ImageRedactorEngine"],
+    "presidio_image_redactor.entities": ["InvalidParamError"],
+}
+
+
+class Placeholder:
+    """Stands in for an engine class when Presidio is not installed"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class Result:
+    def __init__(self, start, end):
+        self.entity_type, self.start, self.end, self.score = "PERSON", start, end, 0.85
+
+    def to_dict(self):
+        return {"entity_type": self.entity_type, "start": self.start, "end": self.end}
+
+
+class StubAnalyzer:
+    def __init__(self):
+        self.calls = 0
+
+    def analyze(self, text, language, entities=None, **kwargs):
+        self.calls += 1
+        return [Result(m.start(), m.end()) for m in re.finditer("John Smith", text)]
+
+
+class StubBatchAnalyzer:
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.batches = 0
+
+    def analyze_iterator(self, texts, language, batch_size, **kwargs):
+        self.batches += 1
+        return [self.analyzer.analyze(text, language) for text in texts]
+
+
+class StubAnonymizer:
+    def anonymize(self, text, analyzer_results, operators=None):
+        new_value = "<REDACTED>" if operators else "<PERSON>"
+        for r in sorted(analyzer_results, key=lambda r: r.start, reverse=True):
+            text = text[: r.start] + new_value + text[r.end :]
+        return types.SimpleNamespace(text=text)
+
+
+@pytest.fixture
+def app_v2(monkeypatch):
+    for name, attrs in PRESIDIO_MODULES.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            module = types.ModuleType(name)
+            for attr in attrs:
+                setattr(module, attr, Placeholder)
+            module.InvalidParamError = ValueError
+            monkeypatch.setitem(sys.modules, name, module)
+
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app.v2.py")
+    spec = importlib.util.spec_from_file_location("presidio_app_v2", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    # Deterministic results whether or not the real engines are installed
+    analyzer = StubAnalyzer()
+    monkeypatch.setattr(module, "analyzer", analyzer)
+    monkeypatch.setattr(module, "batch_analyzer", StubBatchAnalyzer(analyzer))
+    monkeypatch.setattr(module, "anonymizer", StubAnonymizer())
+    return module
+
+
+def test_analyze_anonymize_single_pass(app_v2):
+    response = app_v2.app.test_client().post(
+        "/analyze-anonymize", json={"text": "Hi John Smith"}
+    )
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "results": [{"entity_type": "PERSON", "start": 3, "end": 13}],
+        "anonymized_text": "Hi <PERSON>",
+        "redacted_text": "Hi <REDACTED>",
+    }
+    assert app_v2.analyzer.calls == 1
+
+
+def test_analyze_anonymize_batch(app_v2):
+    client = app_v2.app.test_client()
+    texts = ["John Smith", "nobody", ""]
+    response = client.post("/analyze-anonymize/batch", json={"texts": texts})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [r["anonymized_text"] for r in results] == ["<PERSON>", "nobody", ""]
+    assert app_v2.batch_analyzer.batches == 1
+
+    response = client.post("/analyze-anonymize/batch", json={"texts": ["a", 1]})
+    assert response.status_code == 400
+
+
+def test_process_stream_ndjson(app_v2):
+    long_text = " ".join(["John Smith said hello"] * 3000)
+    body = "\n".join(
+        [
+            json.dumps({"id": 1, "text": long_text}),
+            "not json",
+            json.dumps({"id": 3, "text": 42}),
+            json.dumps({"text": "John Smith"}),
+        ]
+    )
+    response = app_v2.app.test_client().post(
+        "/process/stream",
+        query_string={"action": "redact"},
+        data=body,
+        content_type="application/x-ndjson",
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert lines[0]["id"] == 1
+    assert lines[0]["processed_text"] == long_text.replace("John Smith", "<REDACTED>")
+    # The long record was analyzed window by window
+    assert app_v2.analyzer.calls > 2
+    assert lines[1] == {"id": None, "error": lines[1]["error"], "line": 2}
+    assert lines[1]["error"].startswith("Invalid JSON")
+    assert lines[2] == {"id": 3, "error": "text must be a string", "line": 3}
+    assert lines[3] == {"processed_text": "<REDACTED>"}
+
+
+def test_process_stream_plain_text(app_v2):
+    response = app_v2.app.test_client().post(
+        "/process/stream", data="Dear John Smith,", content_type="text/plain"
+    )
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == "Dear <PERSON>,"
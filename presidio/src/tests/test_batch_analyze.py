@@ -0,0 +1,163 @@
+"""Tests for the offline batch analyzer, with a stub analyzer in place of Presidio"""
+import json
+from collections import namedtuple
+from concurrent.futures import Future
+
+import pytest
+
+import batch_analyze
+
+Result = namedtuple("Result", "entity_type start end score")
+
+
+class StubAnalyzer:
+    """Finds "John", fails on any text containing "BOOM" """
+
+    def __init__(self):
+        self.analyzed = []
+
+    def analyze(self, text, **kwargs):
+        if "BOOM" in text:
+            raise ValueError("analyzer blew up")
+        self.analyzed.append(text)
+        start = text.find("John")
+        return [Result("PERSON", start, start + 4, 0.85)] if start >= 0 else []
+
+
+class StubBatchAnalyzer:
+    def __init__(self):
+        self.analyzer_engine = StubAnalyzer()
+
+    def analyze_iterator(self, texts, batch_size, **kwargs):
+        return [self.analyzer_engine.analyze(text) for text in texts]
+
+
+class InlineExecutor:
+    """Runs submitted work immediately, in this process"""
+
+    def __init__(self, workers, initializer=None, initargs=()):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    stub = StubBatchAnalyzer()
+    monkeypatch.setattr(batch_analyze, "_batch_analyzer", stub)
+    monkeypatch.setattr(batch_analyze, "ProcessPoolExecutor", InlineExecutor)
+    return stub.analyzer_engine
+
+
+def write_corpus(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def run(corpus, out_dir, *extra):
+    args = batch_analyze.parse_args(
+        [corpus, str(out_dir), "--id-field", "id", "--workers", "1",
+         "--batch-size", "2", "--shard-size", "2", *extra]
+    )
+    batch_analyze.run(args)
+
+
+def read_jsonl(out_dir, pattern):
+    return [
+        [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        for path in sorted(out_dir.glob(pattern))
+    ]
+
+
+def test_bad_records_are_quarantined(tmp_path, analyzer):
+    corpus = write_corpus(tmp_path / "in.jsonl", [
+        json.dumps({"id": "a", "text": "John called"}),
+        "{not json",
+        json.dumps({"text": "no id"}),
+        json.dumps({"id": "b", "text": "BOOM"}),
+        json.dumps({"id": "c", "text": "nothing here"}),
+    ])
+    out_dir = tmp_path / "out"
+    run(corpus, out_dir)
+
+    rows = [row for shard in read_jsonl(out_dir, "part-*.jsonl") for row in shard]
+    assert [row["id"] for row in rows] == ["a", "c"]
+    assert rows[0]["entities"][0]["text"] == "John"
+
+    errors = [row for shard in read_jsonl(out_dir, "errors-*.jsonl") for row in shard]
+    assert [row["index"] for row in errors] == [1, 2, 3]
+    assert errors[0]["record"] == "{not json"
+    assert "Missing id field" in errors[1]["error"]
+    assert "analyzer blew up" in errors[2]["error"]
+
+    checkpoint = batch_analyze.load_checkpoint(str(out_dir))
+    assert checkpoint["records_done"] == 5
+    assert checkpoint["errors"] == 3
+
+
+def test_error_rows_are_flushed_at_the_cap(tmp_path, analyzer):
+    corpus = write_corpus(tmp_path / "in.jsonl", ["{bad"] * 5)
+    out_dir = tmp_path / "out"
+    run(corpus, out_dir)
+
+    # Twice the shard size at most, with no good row to complete a shard
+    assert [len(shard) for shard in read_jsonl(out_dir, "errors-*.jsonl")] == [4, 1]
+    assert not list(out_dir.glob("part-*"))
+
+
+def test_resume_after_interrupted_run(tmp_path, analyzer, monkeypatch):
+    lines = [json.dumps({"id": str(i), "text": f"John {i}"}) for i in range(7)]
+    corpus = write_corpus(tmp_path / "in.jsonl", lines)
+    complete_dir = tmp_path / "complete"
+    run(corpus, complete_dir)
+
+    analyze_batch = batch_analyze.analyze_batch
+
+    def killed_at_record_4(batch, *args):
+        if batch[0][0] == 4:
+            raise KeyboardInterrupt
+        return analyze_batch(batch, *args)
+
+    out_dir = tmp_path / "out"
+    monkeypatch.setattr(batch_analyze, "analyze_batch", killed_at_record_4)
+    with pytest.raises(KeyboardInterrupt):
+        run(corpus, out_dir)
+    # Batches still in flight when the run died are not covered
+    records_done = batch_analyze.load_checkpoint(str(out_dir))["records_done"]
+    assert 0 < records_done <= 4
+
+    monkeypatch.setattr(batch_analyze, "analyze_batch", analyze_batch)
+    del analyzer.analyzed[:]
+    run(corpus, out_dir)
+
+    # Only the records after the checkpoint are analyzed again
+    assert analyzer.analyzed == [f"John {i}" for i in range(records_done, 7)]
+    assert read_jsonl(out_dir, "part-*.jsonl") == read_jsonl(complete_dir, "part-*.jsonl")
+
+
+@pytest.mark.parametrize(
+    "extra", [["--shard-size", "3"], ["--id-field", "text"], ["--keep-text"]]
+)
+def test_resume_refuses_other_arguments(tmp_path, analyzer, extra):
+    corpus = write_corpus(tmp_path / "in.jsonl", [json.dumps({"id": "a", "text": "x"})])
+    out_dir = tmp_path / "out"
+    run(corpus, out_dir)
+    with pytest.raises(SystemExit, match="another run"):
+        run(corpus, out_dir, *extra)
+
+
+def test_resume_refuses_other_input(tmp_path, analyzer):
+    line = json.dumps({"id": "a", "text": "x"})
+    out_dir = tmp_path / "out"
+    run(write_corpus(tmp_path / "in.jsonl", [line]), out_dir)
+    with pytest.raises(SystemExit, match="input"):
+        run(write_corpus(tmp_path / "other.jsonl", [line]), out_dir)
@@ -0,0 +1,124 @@
+"""Tests for windowed anonymization of streamed text"""
+import io
+import re
+from collections import namedtuple
+
+import pytest
+
+from stream_anonymizer import (
+    WINDOW_OVERLAP,
+    anonymize_stream,
+    iter_ndjson,
+    iter_text,
+    iter_windows,
+    window_cut,
+)
+
+Result = namedtuple("Result", "entity_type start end score")
+Anonymized = namedtuple("Anonymized", "text")
+
+# Only complete names are found, a name cut by a window edge is not
+NAME = re.compile(r"John ?Smith")
+
+
+class StubAnalyzer:
+    def __init__(self):
+        self.texts = []
+
+    def analyze(self, text, language, entities=None):
+        self.texts.append(text)
+        return [Result("PERSON", m.start(), m.end(), 0.85) for m in NAME.finditer(text)]
+
+
+class StubAnonymizer:
+    def anonymize(self, text, analyzer_results, operators=None):
+        for r in sorted(analyzer_results, key=lambda r: r.start, reverse=True):
+            text = text[: r.start] + f"<{r.entity_type}>" + text[r.end :]
+        return Anonymized(text)
+
+
+def anonymize(chunks, **kwargs):
+    return list(anonymize_stream(chunks, StubAnalyzer(), StubAnonymizer(), **kwargs))
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_entity_across_window_boundary():
+    # Names right at the cut and right at the window end
+    text = "a" * 36 + " John Smith " + "b" * 3 + " John Smith " + "c" * 40
+    assert text.count("John Smith") == 2
+
+    for size in (1, 7, 50, len(text)):
+        pairs = anonymize(chunked(text, size), window=50, overlap=10, with_original=True)
+        assert len(pairs) > 1
+        assert "".join(original for original, _ in pairs) == text
+        assert "".join(out for _, out in pairs) == NAME.sub("<PERSON>", text)
+        # No window is cut inside a name
+        assert not any(o.endswith(("John", "John Smi")) for o, _ in pairs)
+
+
+def test_text_shorter_than_overlap():
+    text = "Call John Smith"
+    assert len(text) < WINDOW_OVERLAP
+    analyzer = StubAnalyzer()
+    out = list(anonymize_stream(chunked(text, 4), analyzer, StubAnonymizer()))
+    assert out == ["Call <PERSON>"]
+    # Analyzed once, when the stream ends
+    assert analyzer.texts == [text]
+
+
+def test_text_without_whitespace():
+    text = ("x" * 17 + "JohnSmith") * 20
+    pairs = anonymize([text], window=40, overlap=10, with_original=True)
+    assert len(pairs) > 1
+    assert all(len(original) <= 40 for original, _ in pairs)
+    assert "".join(original for original, _ in pairs) == text
+    assert "".join(out for _, out in pairs) == text.replace("JohnSmith", "<PERSON>")
+
+
+def test_entity_longer_than_window_widens_it():
+    # Any run of Ns is one entity, also the part of it a window sees
+    analyzer = StubAnalyzer()
+    analyzer.analyze = lambda text, language, entities=None: [
+        Result("ID", m.start(), m.end(), 1.0) for m in re.finditer("N{10,}", text)
+    ]
+    text = "ab " + "N" * 30 + " cd"
+    out = list(
+        anonymize_stream([text], analyzer, StubAnonymizer(), window=20, overlap=5)
+    )
+    assert "".join(out) == "ab <ID> cd"
+
+
+def test_one_large_chunk_matches_small_chunks():
+    text = " ".join(f"word{i} John Smith" for i in range(500))
+    expected = NAME.sub("<PERSON>", text)
+    assert "".join(anonymize([text], window=300, overlap=40)) == expected
+    assert "".join(anonymize(iter_windows(text, 300), window=300, overlap=40)) == expected
+
+
+def test_window_cut_moves_back_to_whitespace():
+    text = "alpha beta gamma delta"
+    assert window_cut(text, [], overlap=5) == len("alpha beta gamma ")
+    # An entity spanning the cut pushes it back to the entity start
+    spanning = [Result("PERSON", 11, 22, 1.0)]
+    assert window_cut(text, spanning, overlap=5) == 11
+
+
+def test_iter_text_keeps_multibyte_characters():
+    data = "naïve café 😀".encode() * 10
+    assert "".join(iter_text(io.BytesIO(data), read_size=3)) == data.decode()
+
+
+def test_iter_ndjson_reports_bad_lines():
+    stream = io.BytesIO(b'{"text": "a"}\n\nnot json\n{"text": "b"}\n')
+    records = list(iter_ndjson(stream))
+    assert [n for n, _ in records] == [1, 3, 4]
+    assert records[0][1] == {"text": "a"}
+    assert isinstance(records[1][1], ValueError)
+
+
+@pytest.mark.parametrize("text", ["", "   "])
+def test_blank_input(text):
+    assert "".join(anonymize([text])) == text
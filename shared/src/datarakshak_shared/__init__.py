@@ -0,0 +1 @@
+"""Code shared by the DataRakshak face_detection and guardian_analyzer services"""
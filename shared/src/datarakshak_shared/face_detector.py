@@ -0,0 +1,204 @@
+"""Face detector backends shared by the face_detection and guardian_analyzer services"""
+import os
+import logging
+import threading
+
+import cv2
+import fitz
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Images larger than this (in pixels) are downscaled before detection
+MAX_IMAGE_SIDE = 1600
+
+DETECTOR_BACKENDS = ("hog", "dnn", "haar")
+
+DEFAULT_DETECTOR = os.environ.get("FACE_DETECTOR_BACKEND", "hog")
+
+
+class FaceDetector:
+    """Base class for face detector backends"""
+
+    name = None
+
+    # Smallest face (in pixels) the backend reliably finds
+    min_face_px = 40
+
+    def detect(self, img_np, small_faces=True):
+        """Detect faces in an RGB array, returning (top, right, bottom, left) boxes
+
+        small_faces=False lets a backend skip extra work (e.g. upsampling)
+        when faces are known to be large in the image.
+        """
+        raise NotImplementedError
+
+
+class HOGFaceDetector(FaceDetector):
+    """dlib HOG detector through face_recognition"""
+
+    name = "hog"
+
+    def __init__(self, upsample=1, model="hog"):
+        import face_recognition
+
+        self._face_locations = face_recognition.face_locations
+        self.upsample = upsample
+        self.model = model
+        # Every upsample pass halves the smallest detectable face
+        self.min_face_px = 80 // (2 ** upsample)
+
+    def detect(self, img_np, small_faces=True):
+        return [
+            tuple(int(v) for v in loc)
+            for loc in self._face_locations(
+                img_np,
+                number_of_times_to_upsample=self.upsample if small_faces else 0,
+                model=self.model,
+            )
+        ]
+
+
+class DNNFaceDetector(FaceDetector):
+    """OpenCV DNN (ResNet-10 SSD) detector loaded from local Caffe model files"""
+
+    name = "dnn"
+    min_face_px = 20
+
+    def __init__(
+        self,
+        model_path=None,
+        config_path=None,
+        confidence=0.5,
+        input_size=(300, 300),
+    ):
+        model_path = model_path or os.environ.get(
+            "FACE_DNN_MODEL", "models/res10_300x300_ssd_iter_140000.caffemodel"
+        )
+        config_path = config_path or os.environ.get(
+            "FACE_DNN_CONFIG", "models/deploy.prototxt"
+        )
+        if not os.path.exists(model_path) or not os.path.exists(config_path):
+            raise FileNotFoundError(
+                f"DNN face model not found: {config_path}, {model_path}"
+            )
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        self.confidence = confidence
+        self.input_size = input_size
+        # setInput/forward keep state on the net, so calls must not interleave
+        self._lock = threading.Lock()
+
+    def detect(self, img_np, small_faces=True):
+        h, w = img_np.shape[:2]
+        # Small faces need the native resolution, the fixed size is much faster
+        size = (w, h) if small_faces and max(w, h) <= 1024 else self.input_size
+        blob = cv2.dnn.blobFromImage(
+            cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR), 1.0, size, (104.0, 177.0, 123.0)
+        )
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        faces = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < self.confidence:
+                continue
+            x0, y0, x1, y1 = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+            left, top = max(0, int(x0)), max(0, int(y0))
+            right, bottom = min(w, int(x1)), min(h, int(y1))
+            if right > left and bottom > top:
+                faces.append((top, right, bottom, left))
+        return faces
+
+
+class HaarFaceDetector(FaceDetector):
+    """OpenCV Haar cascade, the fastest and least accurate backend"""
+
+    name = "haar"
+    min_face_px = 24
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5):
+        cascade_path = cascade_path or os.path.join(
+            cv2.data.haarcascades, "haarcascade_frontalface_default.xml"
+        )
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Could not load Haar cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, img_np, small_faces=True):
+        gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(self.min_face_px, self.min_face_px),
+        )
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+
+_BACKEND_CLASSES = {
+    "hog": HOGFaceDetector,
+    "dnn": DNNFaceDetector,
+    "haar": HaarFaceDetector,
+}
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector(name=None, **kwargs):
+    """Return a detector backend, reusing loaded instances across threads"""
+    name = name or DEFAULT_DETECTOR
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unsupported face detector: {name}")
+    key = (name, tuple(sorted(kwargs.items())))
+    # Held while loading, so racing threads never build the same model twice
+    with _detectors_lock:
+        if key not in _detectors:
+            _detectors[key] = _BACKEND_CLASSES[name](**kwargs)
+        return _detectors[key]
+
+
+def create_face_detector():
+    """DNN detector when FACE_DNN_MODEL and FACE_DNN_CONFIG exist, else Haar"""
+    model_path = os.environ.get("FACE_DNN_MODEL")
+    config_path = os.environ.get("FACE_DNN_CONFIG")
+    if model_path and config_path:
+        if os.path.exists(model_path) and os.path.exists(config_path):
+            return get_detector("dnn", model_path=model_path, config_path=config_path)
+        logger.warning("DNN face model not found, falling back to the Haar cascade")
+    return get_detector("haar")
+
+
+def image_to_array(doc, xref):
+    """Decode an embedded image xref to an RGB array, or None if it has no colors"""
+    pix = fitz.Pixmap(doc, xref)
+    if pix.colorspace is None:
+        # Stencil masks carry no picture to look at
+        return None
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace.n != 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+        pix.height, pix.width, pix.n
+    )
+
+
+def detect_faces_normalized(img_np, detector, max_side=MAX_IMAGE_SIDE):
+    """Detect faces in an RGB array, returning boxes normalized to 0..1"""
+    h, w = img_np.shape[:2]
+    if min(h, w) < detector.min_face_px:
+        return []
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale < 1.0:
+        img_np = cv2.resize(
+            img_np, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
+        )
+        h, w = img_np.shape[:2]
+    return [
+        (top / h, right / w, bottom / h, left / w)
+        for top, right, bottom, left in detector.detect(img_np)
+    ]
@@ -0,0 +1,165 @@
+"""Scanned-page detection and invisible OCR text layers for PDF pages"""
+import os
+import concurrent.futures
+
+import fitz
+import numpy as np
+import pytesseract
+
+DEFAULT_OCR_DPI = 200
+
+# Tesseract word confidences below this are treated as noise
+MIN_WORD_CONFIDENCE = 30
+
+# Invisible text: neither filled nor stroked, but searchable and selectable
+INVISIBLE_TEXT = 3
+
+# A page is OCR'd when images cover at least this share of it while text
+# covers less than MIN_TEXT_COVERAGE (a scan with only a stamp or page number)
+MIN_IMAGE_COVERAGE = 0.25
+MIN_TEXT_COVERAGE = 0.02
+
+
+def classify_page(page):
+    """
+    Decide from text and image coverage whether a page needs OCR
+
+    Coverage is the share of the page area covered by text blocks and by
+    image placements. Returns {"text_coverage", "image_coverage", "needs_ocr"}.
+    """
+    area = abs(page.rect) or 1.0
+    text_area = sum(
+        abs(fitz.Rect(block[:4]))
+        for block in page.get_text("blocks")
+        if block[6] == 0 and block[4].strip()
+    )
+    image_area = sum(abs(fitz.Rect(info["bbox"])) for info in page.get_image_info())
+    text_coverage = min(1.0, text_area / area)
+    image_coverage = min(1.0, image_area / area)
+    return {
+        "text_coverage": round(text_coverage, 4),
+        "image_coverage": round(image_coverage, 4),
+        "needs_ocr": (
+            image_coverage >= MIN_IMAGE_COVERAGE and text_coverage < MIN_TEXT_COVERAGE
+        ),
+    }
+
+
+def pages_needing_ocr(doc):
+    """Page numbers of an open document that should be OCR'd"""
+    return [n for n in range(len(doc)) if classify_page(doc[n])["needs_ocr"]]
+
+
+def rasterize_page(page, dpi=DEFAULT_OCR_DPI):
+    """Render a page to an RGB numpy array at the given DPI"""
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+        pix.height, pix.width, pix.n
+    )
+
+
+def ocr_words(img_np, lang="eng", min_confidence=MIN_WORD_CONFIDENCE):
+    """OCR an image, returning (left, top, width, height, text) word boxes in pixels"""
+    data = pytesseract.image_to_data(
+        img_np, lang=lang, output_type=pytesseract.Output.DICT
+    )
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text or float(data["conf"][i]) < min_confidence:
+            continue
+        words.append(
+            (data["left"][i], data["top"][i], data["width"][i], data["height"][i], text)
+        )
+    return words
+
+
+def add_invisible_text(page, words, dpi=DEFAULT_OCR_DPI, fontname="helv"):
+    """
+    Write OCR words onto a page as invisible text at their real positions
+
+    words are pixel boxes of a render at dpi. Each word is sized to its box
+    height and stretched along its box width, so search_for returns
+    rectangles that cover the word in the page image, rotated pages
+    included. All words go into a single content stream.
+    """
+    if not words:
+        return 0
+    scale = 72.0 / dpi
+    # On pages rotated by 90/270 the text runs along the unrotated y axis
+    vertical = page.rotation % 180 == 90
+    shape = page.new_shape()
+    for left, top, width, height, text in words:
+        fontsize = max(1.0, height * scale)
+        text_width = fitz.get_text_length(text, fontname=fontname, fontsize=fontsize)
+        if text_width <= 0:
+            continue
+        # Baseline sits near the bottom of the box, leaving room for descenders
+        origin = fitz.Point(left * scale, (top + height * 0.8) * scale)
+        origin = origin * page.derotation_matrix
+        stretch = width * scale / text_width
+        morph = fitz.Matrix(1, stretch) if vertical else fitz.Matrix(stretch, 1)
+        shape.insert_text(
+            origin,
+            text,
+            fontname=fontname,
+            fontsize=fontsize,
+            render_mode=INVISIBLE_TEXT,
+            rotate=page.rotation,
+            morph=(origin, morph),
+        )
+    shape.commit()
+    return len(words)
+
+
+def add_ocr_text_layer(
+    doc,
+    pages=None,
+    dpi=DEFAULT_OCR_DPI,
+    lang="eng",
+    max_workers=None,
+    ocr=ocr_words,
+    cached_words=None,
+    on_words=None,
+):
+    """
+    OCR pages of an open document and add their invisible text layer, in place
+
+    Pages are chosen with classify_page unless pages is given. They are
+    rasterized one at a time on the calling thread and OCR'd on a thread
+    pool (Tesseract runs as a subprocess), with at most 2 * max_workers
+    renders in flight. ocr(img_np, lang) returns the word boxes of a render.
+    cached_words(page_num) may return a page's words, so that page is not
+    even rendered, and on_words(page_num, words) is called with freshly
+    OCR'd words. Returns the number of OCR words added per page number.
+    """
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    if pages is None:
+        pages = pages_needing_ocr(doc)
+
+    added = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        pending = {}
+
+        def drain(return_when):
+            done, _ = concurrent.futures.wait(pending, return_when=return_when)
+            for future in done:
+                page_num = pending.pop(future)
+                words = future.result()
+                if on_words is not None:
+                    on_words(page_num, words)
+                added[page_num] = add_invisible_text(doc[page_num], words, dpi)
+
+        for page_num in pages:
+            words = cached_words(page_num) if cached_words is not None else None
+            if words is not None:
+                added[page_num] = add_invisible_text(doc[page_num], words, dpi)
+                continue
+            if len(pending) >= max_workers * 2:
+                drain(concurrent.futures.FIRST_COMPLETED)
+            img_np = rasterize_page(doc[page_num], dpi)
+            pending[executor.submit(ocr, img_np, lang)] = page_num
+
+        if pending:
+            drain(concurrent.futures.ALL_COMPLETED)
+    return added